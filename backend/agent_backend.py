@@ -1,134 +1,288 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate,load_prompt
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableSequence
-from langgraph.graph import StateGraph,START,END
 from langsmith import traceable
-from pydantic import BaseModel,Field
-from typing import Literal,Annotated,Optional,TypedDict
+from typing import Literal,Optional,Callable
 import pandas as pd
 from backend.schema.analyst_state_schema import AnalystState
-from backend.schema.chart_code_schema import ChartCode
 from backend.schema.evaluation_rubric_schema import EvaluationCriteria
-import warnings
-from io import StringIO
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from backend.utils import *
+from backend.registry import AgentRegistry
+from backend.llm_cache import cache_from_env
+from backend.llm_gateway import llm_gateway,shared_http_client
+from backend.dataset_store import dataset_store
+from backend.chart_store import chart_store
+from backend.sandbox import chart_sandbox,execute_chart_code_in_process
+from backend.chart_checks import LOCAL_RUBRIC_FIELDS
+from backend.code_repair import repair_chart_code
+from backend.prompt_builder import build_generator_inputs
+from backend.metrics import timed_node,timer,record_workflow,CHART_EXEC_SECONDS,IMAGE_ENCODE_SECONDS,AGGREGATION_SECONDS,CODE_REPAIRS,PROMPT_TOKENS
+from backend.aggregation import execute_spec,AggregationError
+from backend.schema.aggregation_spec_schema import AggregationSpec
+import hashlib
+import json
+import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# define llms for generation and evaluation tasks
-generator_llm = ChatOpenAI(model="gpt-4o")
-evaluator_llm = ChatOpenAI(model="gpt-4o")
+def default_llm():
+    """Chat model for generation and evaluation tasks, built when the registry first loads"""
+    # langchain_openai/openai take over a second to import, so importing this module does not pay for them
+    from langchain_openai import ChatOpenAI
+    # one pooled HTTP client; retries are left to the gateway so they respect its rate limits and deadlines
+    return ChatOpenAI(model="gpt-4o",http_client=shared_http_client(),max_retries=0)
+
+# persistent response cache shared by generator and evaluator chains (None when LLM_CACHE=0)
+llm_cache = cache_from_env()
+
+# vision detail for the chart image sent to the evaluator: "low" (fixed 85 tokens, enough for the
+# 512px preview), "high" or "auto"
+EVALUATOR_IMAGE_DETAIL = os.getenv("EVALUATOR_IMAGE_DETAIL","low")
 
 @traceable(run_type="llm",name="generate chart code",tags=["chart_code","chart_path"])
+@timed_node("generate_chart_code")
 def generate_chart_code(state:AnalystState) -> dict:
     """Generate/Revise chart code in python based on user query"""
 
-    # load csv data as str as LLMs can handle textual descriptions of dicts — and load_prompt will accept them.
     user_query = state.get("user_query")
-    #data = str(state.get("data"))
-    schema = str(state.get("schema"))
-    rubric_list = state.get("rubric")
-    #feedback = state["rubric"][-1]['feedback'] if state.get("rubric") else "No feedback yet. This is the first attempt."
-    if rubric_list:
-        feedback = [rubric['feedback'] for rubric in rubric_list]
-    else:
-        feedback = "No feedback yet. This is the first attempt."
 
     # file path to save generated chart
     charts = state.get("chart_path") if state.get("chart_path") else []
-    out_path = f"charts/chart_v{str(len(charts))}.png"
+    # each run writes into its own namespace so concurrent requests never collide
+    out_path = chart_store.chart_path(state.get("run_id"),len(charts),state.get("candidate"))
     charts.append(out_path)
     state["chart_path"] = charts
 
-    # define generator llm enforcing schema
-    generator = generator_llm.with_structured_output(ChartCode)
-
     if user_query:
-        prompt = load_prompt(path="backend/prompts/generator_prompt.json") # load saved prompt
-        # create a runnable to invoke 
-        chain = RunnableSequence(prompt,generator)
+        # prompt -> structured generator runnable, built once per process
+        # plan mode: an aggregation spec is generated alongside code that plots only its result
+        plan_mode = bool(state.get("plan_mode"))
+        chain = get_registry().planner_chain if plan_mode else get_registry().generator_chain
+        # latest code + a compact summary of what failed, instead of every earlier feedback,
+        # kept within the prompt token budget
+        prompt = get_registry().prompts["planner" if plan_mode else "generator"]
+        inputs,tokens = build_generator_inputs(prompt,state,out_path)
+        PROMPT_TOKENS.labels(chain="planner" if plan_mode else "generator").observe(tokens)
+        prompt_tokens = list(state.get("prompt_tokens") or []) + [tokens]
+        if state.get("candidate") is not None:
+            # not used by the prompt; keeps best-of-N candidates apart in the response cache
+            inputs["candidate"] = state["candidate"]
         # invoke chain : prompt -> model -> response
-        chart_code = chain.invoke({"user_query":user_query,
-                                 "schema":schema,
-                                 "feedback":feedback,
-                                 "out_path_v1":out_path})
+        chart_code = chain.invoke(inputs)
+        if plan_mode:
+            return {"chart_code":chart_code.code,"chart_path":state["chart_path"],"prompt_tokens":prompt_tokens,
+                    "aggregation_spec":chart_code.spec.model_dump(exclude_defaults=True)}
     
-    return {"chart_code":chart_code.code,"chart_path":state["chart_path"]}
+    return {"chart_code":chart_code.code,"chart_path":state["chart_path"],"prompt_tokens":prompt_tokens}
+
+def execute_chart(chart_code:str,df:pd.DataFrame,dataset_id:str) -> dict:
+    """Run chart code in a warm sandbox process (timeout + memory limit) unless the sandbox is disabled"""
+    start = time.perf_counter()
+    if chart_sandbox is not None:
+        result = chart_sandbox.run(chart_code,df,dataset_id)
+    else:
+        result = execute_chart_code_in_process(chart_code,df)
+    CHART_EXEC_SECONDS.labels(status="error" if result["error"] else "ok").observe(time.perf_counter() - start)
+    # the 300 dpi file is still being written in the background, so /charts should wait for it briefly
+    if result.get("pending_writes"):
+        chart_store.mark_pending(result["pending_writes"])
+    return result
+
+def execution_rank(result:dict) -> tuple:
+    """Lower is better: errors, then structural problems, then warnings"""
+    checks = result.get("checks") or {}
+    return (bool(result["error"]),bool(checks.get("problems")),len(result["warnings"]))
 
 @traceable(name="generate_chart",tags=["max_retry","rubric"])
+@timed_node("generate_chart")
 def generate_chart(state:AnalystState):
     """Generate and save image/PNG from chart code"""
 
     chart_code = state.get("chart_code")
-    df = pd.DataFrame(state["data"]) #reconstruct dataframe
+    df = dataset_store.get(state["dataset_id"]) # resolve handle, no copy of the data
     rubric_list = state.get("rubric")
     feedback = None
     error = None
+    checks = None
+    chart_image = None
+    code_repairs = None
     
     if chart_code:
         # Extract the code within the <execute_python> tags
         chart_code = extract_python_code(chart_code)
         # If code runs successfully, the file chart_{max_retry}.png should have been generated
-        with warnings.catch_warnings(record=True) as w:
-            warnings.simplefilter("always")
+        # run in a warm sandbox process (timeout + memory limit) unless the sandbox is disabled
+        dataset_id = state["dataset_id"]
+        result = None
+        spec = state.get("aggregation_spec")
+        if spec is not None:
+            # plan mode: reduce the full frame first; the plotting code only sees the aggregate
             try:
-                exec_globals = {"df":df}
-                exec(chart_code,exec_globals)
-            except Exception as e:
-                feedback="Chart generation failed."
-                error = str(e)
-            else:
-                if w:
-                    feedback = "Warning detected: " + "; ".join(str(warn.message) for warn in w)
+                with timer(AGGREGATION_SECONDS):
+                    df = execute_spec(df,AggregationSpec.model_validate(spec))
+                # the sandbox caches frames per id, so key the aggregate by dataset + spec
+                spec_digest = hashlib.sha1(json.dumps(spec,sort_keys=True,default=str).encode("utf-8")).hexdigest()[:16]
+                dataset_id = f"{dataset_id}-{spec_digest}"
+            except (AggregationError,ValueError) as e:
+                result = {"error":f"Aggregation spec failed: {e}","warnings":[],"checks":None}
+        if result is None:
+            result = execute_chart(chart_code,df,dataset_id)
+            if execution_rank(result) != (False,False,0):
+                # mechanical failures (imports, column typos, paths, deprecated kwargs) are fixed
+                # locally and re-executed, saving a full LLM round trip
+                repair = repair_chart_code(chart_code,df.dtypes.astype(str).to_dict(),state["chart_path"][-1])
+                if repair is not None:
+                    # the first attempt's file must land before the repaired code rewrites that path
+                    for path in result.get("pending_writes") or []:
+                        chart_store.wait_for(os.path.relpath(path,chart_store.root))
+                    repaired = execute_chart(repair.code,df,dataset_id)
+                    improved = execution_rank(repaired) < execution_rank(result)
+                    CODE_REPAIRS.labels(outcome="improved" if improved else "no_change").inc()
+                    if improved:
+                        result,chart_code,code_repairs = repaired,repair.code,repair.fixes
+        checks = result.get("checks")
+        # low-resolution evaluator image rendered from the live Figure
+        chart_image = result.get("preview")
+        if result.get("preview_seconds") is not None:
+            IMAGE_ENCODE_SECONDS.observe(result["preview_seconds"])
+        if result["error"]:
+            feedback="Chart generation failed."
+            error = result["error"]
+        elif checks and checks["problems"]:
+            # structurally broken chart (empty, no data, not saved): no need for the vision judge
+            feedback = "Local chart checks failed: " + " ".join(checks["problems"])
+            error = "; ".join(checks["problems"])
+        elif result["warnings"]:
+            feedback = "Warning detected: " + "; ".join(result["warnings"])
 
     # update max_retry
     max_retry = state["max_retry"] - 1
     
+    update = {"max_retry":max_retry,"local_checks":checks,"chart_image":chart_image,"code_repairs":code_repairs}
+    if code_repairs:
+        # the evaluator and later retries see the code that actually ran
+        update["chart_code"] = f"<execute_python>\n{chart_code}\n</execute_python>"
+
     # in case of error or warning during execution of chart code, create new rubric
     if error or feedback:               
-        rubric = EvaluationCriteria(feedback=feedback,error=error)
-        rubric_list = serialize_rubric(rubric,state)
-        return {"max_retry":max_retry,"rubric":rubric_list}
+        local_fields = {field:checks[field] for field in LOCAL_RUBRIC_FIELDS} if checks else {}
+        rubric = EvaluationCriteria(feedback=feedback,error=error,**local_fields)
+        update["rubric"] = serialize_rubric(rubric,state)
 
-    return {"max_retry":max_retry}
+    return update
 
 @traceable(run_type="llm",name="evaluate_chart",tags=["rubric"])
+@timed_node("evaluate_chart")
 def evaluate_chart(state:AnalystState):
     """Evaluate llm-generated chart code and generate appropriate rubric-aligned feedback"""
 
     user_query = state.get("user_query")
-    data = str(state.get("data"))
     schema = str(state.get("schema"))
     chart_code = state.get("chart_code")
-    chart_image = encode_image_b64(state.get("chart_path")[-1])
-    
-    # define evaluator LLM-as-judge to refine generated chart
-    evaluator = evaluator_llm.with_structured_output(EvaluationCriteria)
-    
-    # load saved prompt
-    prompt = load_prompt("backend/prompts/evaluator_prompt.json")
-
     # in case of error/warning during last chart generation
     rubric_list = state.get("rubric")
-    error = state.get("rubric")[-1]["error"] if rubric_list else None
     feedback = state.get("rubric")[-1]["feedback"] if rubric_list else None
     warning = "Warning detected:" in feedback if feedback else None
+    # local checks are None when this iteration's code failed to execute
+    checks = state.get("local_checks")
+    error = checks is None or bool(checks["problems"])
 
     if not error:
-       # define runnable to invoke with inputs
-        chain = RunnableSequence(prompt,evaluator)
+        chart_image = state.get("chart_image")
+        if chart_image is None:
+            # no in-memory preview (e.g. it failed to render): thumbnail the saved file instead,
+            # once its deferred full-resolution write has landed
+            path = chart_store.wait_for(os.path.relpath(state.get("chart_path")[-1],chart_store.root))
+            with timer(IMAGE_ENCODE_SECONDS):
+                try:
+                    chart_image = encode_image_b64(path) if path is not None else None
+                except OSError:
+                    chart_image = None
+        if chart_image is None:
+            # never send the judge a broken data URL; fail this evaluation so the loop retries
+            local_fields = {field:checks[field] for field in LOCAL_RUBRIC_FIELDS}
+            rubric = EvaluationCriteria(feedback="The chart image could not be read for evaluation.",
+                                        error="Chart image unavailable for evaluation.",**local_fields)
+            return {"rubric": serialize_rubric(rubric,state)}
+        # evaluator LLM-as-judge runnable, built once per process
+        chain = get_registry().evaluator_chain
+        if state.get("aggregation_spec") is not None:
+            # the judge must know the code plotted a pre-aggregated frame
+            chart_code = f"# aggregation spec executed before this code: {json.dumps(state['aggregation_spec'],default=str)}\n{chart_code}"
         response =  chain.invoke({
                                 "user_query":user_query,
                                 "schema":schema,
                                 "code_v1":chart_code ,
-                                "chart_image":chart_image
+                                "chart_image":chart_image,
+                                "image_detail":EVALUATOR_IMAGE_DETAIL
                                 })
+        # fields decided deterministically from the Figure override the judge's guess
+        response = response.model_copy(update={field:checks[field] for field in LOCAL_RUBRIC_FIELDS})
         rubric_list = serialize_rubric(response,state)
     
     return {"rubric": rubric_list}
     
+def rubric_score(serialized_rubric:dict) -> int:
+    """Number of passing evaluation criteria in a serialized rubric"""
+    current_rubric = EvaluationCriteria.model_validate(serialized_rubric)
+    return current_rubric.has_clarity + current_rubric.has_axis_labels + current_rubric.has_clear_title + current_rubric.has_legend_if_needed + current_rubric.relevance + current_rubric.appropriate_chart_type + current_rubric.correct_data_mapping
+
+@traceable(name="generate_candidates",tags=["num_candidates","rubric"])
+@timed_node("generate_candidates")
+def generate_candidates(state:AnalystState):
+    """Generate, execute and evaluate N candidate programs concurrently; keep the best one"""
+
+    num_candidates = state.get("num_candidates") or 1
+    base_charts = list(state.get("chart_path") or [])
+    base_rubric = list(state.get("rubric") or [])
+
+    def run_candidate(index:int) -> dict:
+        # each candidate works on its own copy of the mutable state lists
+        candidate = {**state,"chart_path":list(base_charts),"rubric":list(base_rubric),"candidate":index}
+        try:
+            for node in (generate_chart_code,generate_chart,evaluate_chart):
+                candidate.update(node(candidate))
+        except Exception as e:
+            # one candidate's model outage or unparsable reply does not sink the whole round
+            candidate["failure"] = e
+        return candidate
+
+    # model calls overlap; chart code runs in separate sandbox workers, or one at a time when the
+    # sandbox is disabled (execute_chart_code_in_process serializes pyplot use)
+    with ThreadPoolExecutor(max_workers=num_candidates,thread_name_prefix="candidate") as pool:
+        candidates = list(pool.map(run_candidate,range(num_candidates)))
+
+    finished = [c for c in candidates if "failure" not in c]
+    if not finished:
+        raise candidates[0]["failure"]
+
+    # failed candidates never win; then error-free ones first, then by rubric total
+    def rank(candidate:dict):
+        last = candidate["rubric"][-1]
+        return (not last.get("error"),rubric_score(last))
+    best = max(finished,key=rank)
+
+    summary = [{"candidate":c["candidate"],
+                "chart_path":c["chart_path"][-1] if "failure" not in c else None,
+                "rubric_total":rubric_score(c["rubric"][-1]) if "failure" not in c else None,
+                "error":str(c["failure"]) if "failure" in c else c["rubric"][-1].get("error")} for c in candidates]
+
+    # only the winner continues into the refinement loop; the round counts as one attempt
+    return {"chart_code":best["chart_code"],
+            "chart_path":base_charts + [best["chart_path"][-1]],
+            "rubric":base_rubric + best["rubric"][len(base_rubric):],
+            "local_checks":best.get("local_checks"),
+            "aggregation_spec":best.get("aggregation_spec"),
+            "code_repairs":best.get("code_repairs"),
+            "prompt_tokens":best.get("prompt_tokens"),
+            "max_retry":state["max_retry"] - 1,
+            "candidates":summary}
+
+def route_start(state:AnalystState) -> Literal["best_of_n","single"]:
+    """Start with a best-of-N round when more than one candidate is requested"""
+    return "best_of_n" if (state.get("num_candidates") or 1) > 1 else "single"
+
 def check_condition(state:AnalystState) -> Literal["retry","end"]:
     """Check condition for feedback loop"""
 
@@ -137,7 +291,7 @@ def check_condition(state:AnalystState) -> Literal["retry","end"]:
     serialized_rubric = state.get("rubric")[-1]
     current_rubric = EvaluationCriteria.model_validate(serialized_rubric)
 
-    rubric_total = current_rubric.has_clarity + current_rubric.has_axis_labels + current_rubric.has_clear_title + current_rubric.has_legend_if_needed + current_rubric.relevance + current_rubric.appropriate_chart_type + current_rubric.correct_data_mapping
+    rubric_total = rubric_score(serialized_rubric)
 
     # retry the chart generation if all criteria not fulfilled by prev code or code has error
     # given the cap of max retry
@@ -149,31 +303,100 @@ def check_condition(state:AnalystState) -> Literal["retry","end"]:
 #------------------------------------------Graph creation and invocation-------------------------------#
 def create_agent():
     """Create langgraph StateGraph with nodes and edges"""
+    from langgraph.graph import StateGraph,START,END
     # create a stategraph with Schema 
     graph = StateGraph(AnalystState)
     # add nodes
     graph.add_node("generate_chart_code",generate_chart_code)
     graph.add_node("generate_chart",generate_chart)
     graph.add_node("evaluate_chart",evaluate_chart)
+    graph.add_node("generate_candidates",generate_candidates)
     # add edges
-    graph.add_edge(START,"generate_chart_code")
+    graph.add_conditional_edges(START,route_start,{"best_of_n":"generate_candidates","single":"generate_chart_code"})
     graph.add_edge("generate_chart_code","generate_chart")
     graph.add_edge("generate_chart","evaluate_chart")
     graph.add_conditional_edges("evaluate_chart",check_condition,{"retry":"generate_chart_code","end":END})
+    # the winning candidate is refined by the regular loop
+    graph.add_conditional_edges("generate_candidates",check_condition,{"retry":"generate_chart_code","end":END})
 
     # compile the graph into a agent
     agent = graph.compile()
 
     return agent
 
+# process-wide agent, prompts and chains; built at startup or on first use
+registry = AgentRegistry(graph_builder=create_agent,llm_factory=default_llm,cache=llm_cache,gateway=llm_gateway)
+
+def get_registry() -> AgentRegistry:
+    """Return the process registry, building it on first use"""
+    return registry.load()
+
+def reload_registry(generator_llm=None,evaluator_llm=None) -> AgentRegistry:
+    """Rebuild the compiled agent, prompts and chains (e.g. after editing prompts or swapping models)"""
+    return registry.reload(generator_llm=generator_llm,evaluator_llm=evaluator_llm)
+
+class WorkflowCancelled(RuntimeError):
+    """Raised when a running workflow is asked to stop between nodes"""
+
+def node_event(node:str,update:dict,elapsed:float) -> dict:
+    """Summarize one node transition for progress streaming"""
+    event = {"node":node,"elapsed":round(elapsed,3)}
+    update = update or {}
+    rubric_list = update.get("rubric")
+    if node == "generate_chart_code":
+        event["chart_code"] = update.get("chart_code")
+        event["chart_path"] = update["chart_path"][-1] if update.get("chart_path") else None
+        # where /charts serves this version once generate_chart has rendered it
+        event["chart_url"] = f"/{event['chart_path']}" if event["chart_path"] else None
+        event["aggregation_spec"] = update.get("aggregation_spec")
+        event["prompt_tokens"] = update["prompt_tokens"][-1] if update.get("prompt_tokens") else None
+    elif node == "generate_chart":
+        # an execution error/warning shows up as a fresh rubric entry from this node
+        event["rubric"] = rubric_list[-1] if rubric_list else None
+        event["max_retry"] = update.get("max_retry")
+        event["code_repairs"] = update.get("code_repairs")
+    elif node == "evaluate_chart":
+        event["rubric"] = rubric_list[-1] if rubric_list else None
+    elif node == "generate_candidates":
+        event["chart_code"] = update.get("chart_code")
+        event["chart_path"] = update["chart_path"][-1] if update.get("chart_path") else None
+        event["chart_url"] = f"/{event['chart_path']}" if event["chart_path"] else None
+        event["rubric"] = rubric_list[-1] if rubric_list else None
+        event["candidates"] = update.get("candidates")
+        event["aggregation_spec"] = update.get("aggregation_spec")
+    return event
+
 @traceable(name="run_workflow",tags=["agent","final_state"])
-def run_workflow(initial_state:AnalystState) -> AnalystState:
+def run_workflow(initial_state:AnalystState,cancel_event:Optional[threading.Event]=None,
+                 on_event:Optional[Callable[[dict],None]]=None) -> AnalystState:
     """Invoke langgraph agent,return final state"""
     
-    # create reflective agent
-    agent = create_agent()
+    # reflective agent compiled once per process
+    agent = get_registry().agent
 
-    final_state = agent.invoke(initial_state)
+    start = time.perf_counter()
+    try:
+        if cancel_event is None and on_event is None:
+            final_state = agent.invoke(initial_state)
+        else:
+            # stream node updates and full state snapshots so progress can be reported
+            # and a cancellation honoured after every node
+            final_state = initial_state
+            for mode,chunk in agent.stream(initial_state,stream_mode=["updates","values"]):
+                if mode == "updates" and on_event is not None:
+                    for node,update in chunk.items():
+                        on_event(node_event(node,update,time.perf_counter() - start))
+                elif mode == "values":
+                    final_state = chunk
+                if cancel_event is not None and cancel_event.is_set():
+                    raise WorkflowCancelled("Workflow cancelled by user.")
+    except WorkflowCancelled:
+        record_workflow("cancelled",time.perf_counter() - start)
+        raise
+    except Exception:
+        record_workflow("failed",time.perf_counter() - start)
+        raise
+    record_workflow("completed",time.perf_counter() - start,final_state)
     return final_state
 
 """
@@ -185,7 +408,7 @@ df,schema = load_csv_data(data_path)
 # define initial state -- all required fields
 initial_state = {
                 "user_query": "Plot the relationship between gender,class and survival rate.",
-                 "data": df.head(5).to_dict(orient="records"), # passing sample only
+                 "dataset_id": dataset_store.put(df), # passing a handle only
                  "schema": schema, # passing metadata for deeper understanding to the llm
                  "max_retry": 3
                  }
@@ -0,0 +1,110 @@
+import os
+import pandas as pd
+from backend.schema.aggregation_spec_schema import AggregationSpec
+
+# upper bounds so a careless spec still hands the plotting code a small frame
+MAX_RESULT_ROWS = int(os.getenv("AGGREGATION_MAX_ROWS", "5000"))
+DEFAULT_SAMPLE_SIZE = int(os.getenv("AGGREGATION_SAMPLE_ROWS", "5000"))
+# datasets at least this large use plan mode unless the request says otherwise
+PLAN_MODE_MIN_ROWS = int(os.getenv("PLAN_MODE_MIN_ROWS", "1000000"))
+
+
+class AggregationError(ValueError):
+    """The aggregation spec cannot be executed against this dataset"""
+
+
+def _require(df: pd.DataFrame, columns, what: str):
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise AggregationError(f"Unknown {what} column(s) {missing}; available columns: {list(df.columns)}")
+
+
+def _filter_mask(series: pd.Series, op: str, value) -> pd.Series:
+    if op == "is null":
+        return series.isna()
+    if op == "not null":
+        return series.notna()
+    if op in ("in", "not in"):
+        values = value if isinstance(value, list) else [value]
+        mask = series.isin(values)
+        return ~mask if op == "not in" else mask
+    if value is None or isinstance(value, list):
+        raise AggregationError(f"Operator '{op}' needs a single comparison value")
+    if pd.api.types.is_datetime64_any_dtype(series) and isinstance(value, str):
+        value = pd.Timestamp(value)
+    try:
+        return {"==": series.eq, "!=": series.ne, ">": series.gt, ">=": series.ge,
+                "<": series.lt, "<=": series.le}[op](value)
+    except TypeError as e:
+        raise AggregationError(f"Cannot compare column '{series.name}' with {value!r}: {e}") from e
+
+
+def _bin(series: pd.Series, bins, freq) -> pd.Series:
+    if freq:
+        if not pd.api.types.is_datetime64_any_dtype(series):
+            series = pd.to_datetime(series, errors="coerce")
+        return series.dt.to_period(freq).dt.start_time
+    if not pd.api.types.is_numeric_dtype(series):
+        raise AggregationError(f"Column '{series.name}' is not numeric; use freq for datetime columns")
+    # string labels keep the result easy to plot; the ordered categorical keeps the bins in numeric
+    # order through groupby/sorting, and missing values stay NaN rather than becoming a "nan" bin
+    return pd.cut(series, bins=bins or 10).cat.rename_categories(str).cat.as_ordered()
+
+
+def execute_spec(df: pd.DataFrame, spec: AggregationSpec) -> pd.DataFrame:
+    """Reduce df according to the spec with vectorized pandas operations.
+
+    The cost is one pass over the rows for filtering/binning plus a groupby; the returned frame
+    has one row per group (or a row sample when no measures are given), capped at MAX_RESULT_ROWS.
+    Any spec pandas rejects (e.g. a mean over a text column) raises AggregationError.
+    """
+    try:
+        return _execute_spec(df, spec)
+    except (TypeError, KeyError) as e:
+        raise AggregationError(f"Cannot execute the aggregation spec: {type(e).__name__}: {e}") from e
+
+
+def _execute_spec(df: pd.DataFrame, spec: AggregationSpec) -> pd.DataFrame:
+    _require(df, [f.column for f in spec.filters], "filter")
+    _require(df, [b.column for b in spec.bins], "bin")
+    _require(df, [m.column for m in spec.measures if m.column], "measure")
+
+    if spec.filters:
+        mask = pd.Series(True, index=df.index)
+        for f in spec.filters:
+            mask &= _filter_mask(df[f.column], f.op, f.value).fillna(False).astype(bool)
+        df = df[mask]
+
+    bin_names = [b.alias or f"{b.column}_bin" for b in spec.bins]
+    unknown = [name for name in spec.group_by if name not in df.columns and name not in bin_names]
+    if unknown:
+        raise AggregationError(f"Unknown group_by column(s) {unknown}; available columns: "
+                               f"{list(df.columns)}, bins: {bin_names}")
+
+    if not spec.measures:
+        # raw rows (e.g. scatter plots): sample first so binning only touches the sample
+        size = min(spec.sample_size or DEFAULT_SAMPLE_SIZE, MAX_RESULT_ROWS)
+        if len(df) > size:
+            df = df.sample(n=size, random_state=0)
+        result = df.assign(**{name: _bin(df[b.column], b.bins, b.freq) for name, b in zip(bin_names, spec.bins)})
+        result = result.reset_index(drop=True)
+    else:
+        binned = {name: _bin(df[b.column], b.bins, b.freq) for name, b in zip(bin_names, spec.bins)}
+        keys = [(binned[name] if name in binned else df[name]).rename(name) for name in spec.group_by]
+        named = {}
+        for m in spec.measures:
+            # count without a column counts rows, including those with missing values
+            column, agg = (df.columns[0], "size") if m.column is None else (m.column, m.agg)
+            if m.column is None and m.agg != "count":
+                raise AggregationError(f"Measure '{m.agg}' needs a column")
+            named[m.alias or f"{m.agg}_{m.column or 'rows'}"] = (column, agg)
+        if keys:
+            result = df.groupby(keys, observed=True, dropna=False, sort=True).agg(**named).reset_index()
+        else:
+            result = pd.DataFrame({name: [len(df) if agg == "size" else df[column].agg(agg)]
+                                   for name, (column, agg) in named.items()})
+
+    if spec.sort_by:
+        _require(result, [spec.sort_by], "sort_by")
+        result = result.sort_values(spec.sort_by, ascending=False, kind="stable")
+    return result.head(min(spec.limit or MAX_RESULT_ROWS, MAX_RESULT_ROWS)).reset_index(drop=True)
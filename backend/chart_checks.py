@@ -0,0 +1,175 @@
+import contextlib
+import math
+import os
+import threading
+from typing import Optional
+
+# rubric fields that can be decided from the Figure itself
+LOCAL_RUBRIC_FIELDS = ("has_clear_title", "has_axis_labels", "has_legend_if_needed")
+
+
+# captures active on the current thread, innermost last; see capture_saved_figures
+_captures = threading.local()
+_hook_lock = threading.Lock()
+_original_savefig = None
+
+
+def _capturing_savefig(fig, *args, **kwargs):
+    """Figure.savefig replacement: records/defers the save for the calling thread's active capture"""
+    stack = getattr(_captures, "stack", None)
+    if not stack:
+        return _original_savefig(fig, *args, **kwargs)
+    saved, deferred = stack[-1]
+    saved.append(fig)
+    if deferred is not None and args and isinstance(args[0], (str, os.PathLike)):
+        deferred.append((fig, args, kwargs))
+        return None
+    return _original_savefig(fig, *args, **kwargs)
+
+
+def _install_savefig_hook():
+    """Patch Figure.savefig once per process and never restore it.
+
+    Swapping the class attribute per capture is not safe with concurrent captures: their restores
+    interleave and can leave a finished capture's wrapper installed for good. The permanent hook
+    only dispatches, so captures on different threads cannot see or undo each other.
+    """
+    global _original_savefig
+    from matplotlib.figure import Figure
+    with _hook_lock:
+        if _original_savefig is None:
+            _original_savefig = Figure.savefig
+            Figure.savefig = _capturing_savefig
+
+
+@contextlib.contextmanager
+def capture_saved_figures(deferred: Optional[list] = None):
+    """Record every matplotlib Figure that gets saved on this thread while the block runs.
+
+    If a `deferred` list is given, saves to a file path are not written but appended to it as
+    (figure, args, kwargs) so the caller can replay them later (see chart_render.write_deferred).
+    """
+    _install_savefig_hook()
+    saved = []
+    stack = getattr(_captures, "stack", None)
+    if stack is None:
+        stack = _captures.stack = []
+    stack.append((saved, deferred))
+    try:
+        yield saved
+    finally:
+        stack.pop()
+
+
+def _finite(values) -> bool:
+    """True if an array-like holds at least one finite number"""
+    import numpy as np
+    try:
+        return bool(np.isfinite(np.asarray(values, dtype=float)).any())
+    except (TypeError, ValueError):
+        # non-numeric data (e.g. category strings) counts as data
+        return len(values) > 0
+
+
+def _data_artists(ax) -> tuple[int, int]:
+    """(number of data-bearing artists, how many of them hold finite data)"""
+    from matplotlib.collections import PathCollection
+    from matplotlib.patches import Rectangle, Wedge
+
+    total = with_data = 0
+    for line in ax.get_lines():
+        total += 1
+        with_data += _finite(line.get_ydata())
+    for collection in ax.collections:
+        total += 1
+        array = collection.get_array()
+        if isinstance(collection, PathCollection):
+            # scatter: one marker path, one offset per point
+            offsets = collection.get_offsets()
+            with_data += len(offsets) > 0 and _finite(offsets)
+        elif array is not None and array.size:
+            # heatmaps / meshes carry their values in the color array
+            with_data += _finite(array.ravel())
+        else:
+            with_data += bool(collection.get_paths())
+    for patch in ax.patches:
+        if isinstance(patch, Rectangle):
+            total += 1
+            with_data += math.isfinite(patch.get_height()) and patch.get_height() != 0
+        elif isinstance(patch, Wedge):
+            total += 1
+            with_data += patch.theta2 != patch.theta1
+    total += len(ax.images)
+    with_data += len(ax.images)
+    return total, with_data
+
+
+def _is_pie(ax) -> bool:
+    from matplotlib.patches import Wedge
+    return bool(ax.patches) and all(isinstance(patch, Wedge) for patch in ax.patches)
+
+
+def _needs_legend(ax) -> bool:
+    """More than one labelled series on the axes means a legend is needed"""
+    labels = {artist.get_label() for artist in [*ax.get_lines(), *ax.collections, *ax.containers]
+              if artist.get_label() and not artist.get_label().startswith("_")}
+    return len(labels) > 1
+
+
+def _has_axis_label(ax, which: str, figure_label: str) -> bool:
+    """An axis is labelled by its own label, a shared sibling's or twin's label (subplot grids,
+    FacetGrid outer labels, twinx/twiny) or the figure-level supxlabel/supylabel"""
+    if figure_label:
+        return True
+    shared = ax.get_shared_x_axes() if which == "x" else ax.get_shared_y_axes()
+    get_label = (lambda other: other.get_xlabel()) if which == "x" else (lambda other: other.get_ylabel())
+    return any(get_label(other).strip() for other in shared.get_siblings(ax))
+
+
+def inspect_figure(fig) -> dict:
+    """Deterministic rubric pre-check of a rendered Figure.
+
+    Returns the three locally decidable rubric fields plus a list of structural problems
+    (empty plot, no plotted data) that make an LLM review pointless.
+    """
+    # colorbars are separate axes without data of their own
+    axes = [ax for ax in fig.get_axes() if ax.get_visible() and not hasattr(ax, "_colorbar")]
+    problems = []
+
+    suptitle = fig._suptitle.get_text().strip() if fig._suptitle is not None else ""
+    has_title = bool(suptitle) or any(ax.get_title(loc=loc).strip()
+                                      for ax in axes for loc in ("center", "left", "right"))
+
+    data_axes = []
+    for ax in axes:
+        total, with_data = _data_artists(ax)
+        if total:
+            data_axes.append(ax)
+            if not with_data:
+                problems.append("The chart contains plot elements but no valid data values "
+                                "(all values are missing or zero); check filters and aggregations.")
+    if not data_axes:
+        problems.append("The chart is empty: nothing was plotted on the figure.")
+
+    supxlabel, supylabel = (getattr(fig, name, None) for name in ("_supxlabel", "_supylabel"))
+    supxlabel = supxlabel.get_text().strip() if supxlabel is not None else ""
+    supylabel = supylabel.get_text().strip() if supylabel is not None else ""
+    has_labels = all(_is_pie(ax) or (_has_axis_label(ax, "x", supxlabel) and _has_axis_label(ax, "y", supylabel))
+                     for ax in data_axes)
+    has_legend = all(not _needs_legend(ax) or ax.get_legend() is not None for ax in data_axes) or bool(fig.legends)
+
+    return {
+        "has_clear_title": int(has_title),
+        "has_axis_labels": int(bool(data_axes) and has_labels),
+        "has_legend_if_needed": int(has_legend),
+        # de-duplicate while keeping order
+        "problems": list(dict.fromkeys(problems)),
+    }
+
+
+def check_saved_figures(figures: list) -> dict:
+    """Pre-check the last saved figure, or flag that nothing was saved at all"""
+    if not figures:
+        return {"has_clear_title": 0, "has_axis_labels": 0, "has_legend_if_needed": 0,
+                "problems": ["No figure was saved; call plt.savefig() with the requested output path."]}
+    return inspect_figure(figures[-1])
@@ -0,0 +1,77 @@
+import base64
+import os
+import uuid
+from io import BytesIO
+
+# longest side of the evaluator image; the judge never needs print resolution
+PREVIEW_MAX_PX = int(os.getenv("EVALUATOR_IMAGE_PX", "512"))
+PREVIEW_JPEG_QUALITY = 85
+# savefig options that only matter for the target file, not for how the figure looks
+_FILE_ONLY_KWARGS = ("dpi", "format", "metadata", "pil_kwargs", "fname")
+
+
+def render_preview(fig, savefig_kwargs: dict = None, max_px: int = PREVIEW_MAX_PX) -> str:
+    """Render a live Figure straight to a small base64 JPEG, without touching the disk"""
+    kwargs = {k: v for k, v in (savefig_kwargs or {}).items() if k not in _FILE_ONLY_KWARGS}
+    # pick the dpi that makes the longest side max_px (tight bbox can only shrink it)
+    dpi = max_px / max(fig.get_size_inches())
+    buf = BytesIO()
+    fig.savefig(buf, format="jpeg", dpi=dpi, pil_kwargs={"quality": PREVIEW_JPEG_QUALITY}, **kwargs)
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+def prime_font_cache():
+    """Load matplotlib's font list on the Agg backend, building the on-disk cache if it is missing"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.font_manager  # noqa: F401  scans the system fonts once per cache directory
+
+
+def warm_plotting():
+    """Import the plotting stack and draw one throwaway chart.
+
+    Pays up front for what the first real chart would: pyplot and seaborn imports, the font cache,
+    loading the default font for titles and labels, and the PNG/JPEG encoders.
+    """
+    prime_font_cache()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig, ax = plt.subplots(figsize=(4, 3))
+    sns.barplot(x=["a", "b"], y=[1, 2], hue=["a", "b"], legend=False, ax=ax)
+    ax.set_title("warm-up")
+    ax.set_xlabel("x")
+    ax.set_ylabel("y")
+    fig.savefig(BytesIO(), format="png", dpi=72)
+    render_preview(fig)
+    plt.close(fig)
+
+
+class ChartWriteError(RuntimeError):
+    """Raised when deferred chart files could not be written"""
+
+
+def write_deferred(deferred: list) -> list[str]:
+    """Replay savefig calls held back during execution; each file appears atomically.
+
+    Every call is attempted; raises ChartWriteError naming each expected file that does not exist
+    afterwards, so a lost chart is never silent.
+    """
+    written, failed = [], []
+    for fig, args, kwargs in deferred:
+        path = os.fspath(args[0])
+        directory, name = os.path.split(path)
+        # same extension, so the format is still inferred from the file name
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex[:8]}-{name}")
+        try:
+            fig.savefig(tmp_path, *args[1:], **kwargs)
+            os.replace(tmp_path, path)
+            written.append(path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            failed.append(f"{path} ({e})")
+    deferred.clear()
+    failed += [f"{path} (missing after write)" for path in written if not os.path.exists(path)]
+    if failed:
+        raise ChartWriteError(f"Chart file(s) not written: {'; '.join(failed)}")
+    return written
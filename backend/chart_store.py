@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+CHARTS_DIR = "charts"
+
+
+class ChartStore:
+    """Per-request chart namespaces under the charts directory, with age/size based eviction"""
+
+    def __init__(self, root: str = CHARTS_DIR, max_age_seconds: int = 24 * 3600,
+                 max_total_bytes: int = 1024 ** 3, cleanup_interval: int = 300):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_total_bytes = max_total_bytes
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        # charts whose full-resolution file is still being written: real path -> deadline
+        self._pending: dict[str, float] = {}
+
+    def new_namespace(self) -> str:
+        """Fresh namespace for one analysis run"""
+        return uuid.uuid4().hex
+
+    def chart_path(self, namespace: Optional[str], version: int, candidate: Optional[int] = None) -> str:
+        """Relative output path for a chart version (and best-of-N candidate), creating the namespace directory"""
+        directory = os.path.join(self.root, namespace) if namespace else self.root
+        os.makedirs(directory, exist_ok=True)
+        suffix = f"_c{candidate}" if candidate is not None else ""
+        return f"{directory}/chart_v{version}{suffix}.png"
+
+    def resolve(self, chart_path: str) -> Optional[str]:
+        """Map a requested chart path to a file inside the store; None if outside or missing"""
+        root = os.path.realpath(self.root)
+        file_path = os.path.realpath(os.path.join(root, chart_path))
+        if os.path.commonpath([root, file_path]) != root or not os.path.isfile(file_path):
+            return None
+        return file_path
+
+    def mark_pending(self, chart_paths: list[str], timeout: float = 30):
+        """Announce chart files that a background writer will create shortly"""
+        deadline = time.time() + timeout
+        with self._lock:
+            now = time.time()
+            self._pending = {path: until for path, until in self._pending.items() if until > now}
+            for chart_path in chart_paths:
+                self._pending[os.path.realpath(chart_path)] = deadline
+
+    def wait_for(self, chart_path: str, poll_interval: float = 0.05) -> Optional[str]:
+        """resolve(), but give a pending chart file until its deadline to appear"""
+        file_path = self.resolve(chart_path)
+        target = os.path.realpath(os.path.join(self.root, chart_path))
+        while file_path is None:
+            with self._lock:
+                deadline = self._pending.get(target)
+            if deadline is None or time.time() >= deadline:
+                return None
+            time.sleep(poll_interval)
+            file_path = self.resolve(chart_path)
+        with self._lock:
+            self._pending.pop(file_path, None)
+        return file_path
+
+    @staticmethod
+    def etag(file_path: str) -> str:
+        """Validator derived from the file's size and modification time"""
+        stat = os.stat(file_path)
+        digest = hashlib.sha1(f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+        return f'"{digest[:20]}"'
+
+    def maybe_cleanup(self):
+        """Run cleanup() at most once per cleanup_interval"""
+        now = time.time()
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._last_cleanup = now
+            self.cleanup()
+
+    def cleanup(self) -> int:
+        """Evict charts older than max_age_seconds, then the oldest ones until under max_total_bytes"""
+        with self._lock:
+            if not os.path.isdir(self.root):
+                return 0
+            files = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            files.sort()
+            cutoff = time.time() - self.max_age_seconds
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for mtime, size, path in files:
+                if mtime >= cutoff and total <= self.max_total_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+
+            # drop namespace directories left empty
+            for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+                if dirpath != self.root and not dirnames and not filenames:
+                    try:
+                        os.rmdir(dirpath)
+                    except OSError:
+                        pass
+            return removed
+
+
+# process-wide chart store
+chart_store = ChartStore(
+    max_age_seconds=int(os.getenv("CHART_MAX_AGE_SECONDS", str(24 * 3600))),
+    max_total_bytes=int(os.getenv("CHART_MAX_TOTAL_MB", "1024")) * 1024 * 1024,
+)
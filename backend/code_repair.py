@@ -0,0 +1,227 @@
+import ast
+import difflib
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+# conventional aliases generated code relies on, and the import that defines each
+KNOWN_IMPORTS = {
+    "plt": "import matplotlib.pyplot as plt",
+    "sns": "import seaborn as sns",
+    "pd": "import pandas as pd",
+    "np": "import numpy as np",
+    "mticker": "import matplotlib.ticker as mticker",
+    "mdates": "import matplotlib.dates as mdates",
+    "matplotlib": "import matplotlib",
+    "math": "import math",
+}
+# keyword arguments of seaborn / pandas / matplotlib calls whose string value names a column
+COLUMN_KEYWORDS = {"x", "y", "hue", "col", "row", "size", "style", "weights", "units",
+                   "by", "index", "columns", "values", "subset", "column"}
+# DataFrame methods whose positional string arguments name columns
+COLUMN_METHODS = {"groupby", "sort_values", "pivot_table", "pivot", "nlargest", "nsmallest",
+                  "set_index", "drop_duplicates", "dropna", "explode", "melt", "value_counts"}
+# seaborn functions that warn when given a palette without hue (seaborn >= 0.13)
+PALETTE_NEEDS_HUE = {"barplot", "countplot", "boxplot", "violinplot", "boxenplot", "stripplot",
+                     "swarmplot", "pointplot"}
+# close enough to be the same column, far enough apart that distinct names are left alone
+COLUMN_MATCH_CUTOFF = 0.8
+
+
+@dataclass
+class Repair:
+    """Repaired chart code plus a short description of every fix applied"""
+    code: str
+    fixes: list[str] = field(default_factory=list)
+
+
+def _is_call_to(node: ast.AST, attr: str, owner: Optional[str] = None) -> bool:
+    """node is a call of `<owner>.attr(...)` (any owner when owner is None)"""
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == attr
+            and (owner is None or (isinstance(node.func.value, ast.Name) and node.func.value.id == owner)))
+
+
+def _defined_names(tree: ast.AST) -> set[str]:
+    """Names bound anywhere in the code (imports, assignments, loop targets, functions)"""
+    names = {"df"}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+    return names
+
+
+def _created_columns(tree: ast.AST) -> set[str]:
+    """Column names the code itself creates (assignments, renames, named aggregations)"""
+    created = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store) \
+                and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            created.add(node.slice.value)
+        elif isinstance(node, ast.Call):
+            for keyword in node.keywords:
+                if keyword.arg == "name" and isinstance(keyword.value, ast.Constant):
+                    created.add(str(keyword.value.value))
+                elif keyword.arg == "columns" and isinstance(keyword.value, ast.Dict):
+                    created.update(str(value.value) for value in keyword.value.values
+                                   if isinstance(value, ast.Constant))
+            if _is_call_to(node, "agg") or _is_call_to(node, "assign"):
+                created.update(keyword.arg for keyword in node.keywords if keyword.arg)
+    return created
+
+
+def _column_literals(tree: ast.AST) -> Iterable[ast.Constant]:
+    """String constants that appear where a column name is expected"""
+    def strings(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            yield node
+        elif isinstance(node, (ast.List, ast.Tuple)):
+            for element in node.elts:
+                yield from strings(element)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load):
+            yield from strings(node.slice)
+        elif isinstance(node, ast.Call):
+            for keyword in node.keywords:
+                if keyword.arg in COLUMN_KEYWORDS:
+                    yield from strings(keyword.value)
+            if isinstance(node.func, ast.Attribute) and node.func.attr in COLUMN_METHODS:
+                for arg in node.args:
+                    yield from strings(arg)
+
+
+def match_column(name: str, columns: list[str]) -> Optional[str]:
+    """The existing column a misspelt name most likely refers to, if any is close enough"""
+    lowered = {column.lower(): column for column in columns}
+    if name.lower() in lowered:
+        return lowered[name.lower()]
+    normalized = {column.lower().replace("_", "").replace(" ", ""): column for column in columns}
+    key = name.lower().replace("_", "").replace(" ", "")
+    if key in normalized:
+        return normalized[key]
+    matches = difflib.get_close_matches(name.lower(), list(lowered), n=1, cutoff=COLUMN_MATCH_CUTOFF)
+    return lowered[matches[0]] if matches else None
+
+
+class _Fixer(ast.NodeTransformer):
+    """Statement- and call-level rewrites that never change what the chart means"""
+
+    def __init__(self, out_path: Optional[str], categorical: set[str]):
+        self.out_path = out_path
+        self.categorical = categorical
+        self.fixes: list[str] = []
+        self.saves = 0
+
+    def visit_Expr(self, node: ast.Expr):
+        # plt.show() / fig.show() only warn on the non-interactive backend
+        if _is_call_to(node.value, "show"):
+            self.fixes.append("removed show() call")
+            return None
+        return self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        if _is_call_to(node, "savefig"):
+            self.saves += 1
+            target = node.args[0] if node.args else next((k.value for k in node.keywords if k.arg == "fname"), None)
+            if self.out_path and isinstance(target, ast.Constant) and target.value != self.out_path:
+                target.value = self.out_path
+                self.fixes.append(f"savefig path set to {self.out_path}")
+        if isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) \
+                and node.func.value.id == "sns":
+            self._fix_seaborn(node)
+        return node
+
+    def _fix_seaborn(self, node: ast.Call):
+        keywords = {keyword.arg: keyword for keyword in node.keywords if keyword.arg}
+        if "ci" in keywords and "errorbar" not in keywords:
+            # seaborn 0.12 replaced ci= with errorbar=
+            ci = keywords["ci"]
+            value = ci.value
+            if isinstance(value, ast.Constant) and isinstance(value.value, (int, float)) \
+                    and not isinstance(value.value, bool):
+                value = ast.Tuple(elts=[ast.Constant("ci"), ast.Constant(value.value)], ctx=ast.Load())
+            elif isinstance(value, ast.Constant) and value.value is False:
+                value = ast.Constant(None)
+            ci.arg, ci.value = "errorbar", value
+            self.fixes.append("seaborn ci= replaced with errorbar=")
+        if node.func.attr == "violinplot" and "scale" in keywords and "density_norm" not in keywords:
+            keywords["scale"].arg = "density_norm"
+            self.fixes.append("seaborn violinplot scale= replaced with density_norm=")
+        if node.func.attr in PALETTE_NEEDS_HUE and "palette" in keywords and "hue" not in keywords:
+            # a palette without hue is deprecated: colour by the categorical axis instead
+            axis = next((keywords[name] for name in ("x", "y") if name in keywords
+                         and isinstance(keywords[name].value, ast.Constant)
+                         and keywords[name].value.value in self.categorical), None)
+            if axis is not None:
+                node.keywords.append(ast.keyword(arg="hue", value=axis.value))
+                if "legend" not in keywords:
+                    node.keywords.append(ast.keyword(arg="legend", value=ast.Constant(False)))
+                self.fixes.append("seaborn palette without hue: hue set to the categorical axis")
+
+
+def _add_missing_imports(tree: ast.Module, fixes: list[str]):
+    defined = _defined_names(tree)
+    used = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+    missing = sorted(name for name in used - defined if name in KNOWN_IMPORTS)
+    if missing:
+        tree.body[:0] = ast.parse("\n".join(KNOWN_IMPORTS[name] for name in missing)).body
+        fixes.append(f"added missing import(s): {', '.join(missing)}")
+
+
+def _fix_columns(tree: ast.Module, columns: list[str], fixes: list[str]):
+    known = set(columns) | _created_columns(tree)
+    for literal in _column_literals(tree):
+        if literal.value in known:
+            continue
+        match = match_column(literal.value, columns)
+        if match is not None:
+            fixes.append(f"column '{literal.value}' -> '{match}'")
+            literal.value = match
+
+
+def _ensure_savefig(tree: ast.Module, out_path: str, fixes: list[str]):
+    """Save the current figure before the first top-level plt.close() (or at the end)"""
+    save = ast.parse(f"plt.savefig({out_path!r}, dpi=300, bbox_inches='tight')").body[0]
+    position = next((i for i, stmt in enumerate(tree.body)
+                     if isinstance(stmt, ast.Expr) and _is_call_to(stmt.value, "close", "plt")), len(tree.body))
+    tree.body.insert(position, save)
+    fixes.append(f"added missing savefig to {out_path}")
+
+
+def repair_chart_code(code: str, dtypes: dict, out_path: Optional[str] = None) -> Optional[Repair]:
+    """Apply safe, rule-based fixes to generated chart code.
+
+    `dtypes` maps the dataset's columns to their dtype names. Fixes: missing imports of the usual
+    aliases, misspelt column names (fuzzy-matched against the columns), a wrong or missing savefig
+    path, plt.show() calls and deprecated seaborn keywords. Returns None when the code does not
+    parse or nothing needed fixing.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    columns = [str(column) for column in dtypes]
+    categorical = {str(column) for column, dtype in dtypes.items()
+                   if not str(dtype).startswith(("int", "uint", "float", "Int", "UInt", "Float"))}
+    # columns first, so the seaborn rules see the corrected names
+    fixes = []
+    _fix_columns(tree, columns, fixes)
+    fixer = _Fixer(out_path, categorical)
+    tree = fixer.visit(tree)
+    fixes += fixer.fixes
+    if out_path and fixer.saves == 0:
+        _ensure_savefig(tree, out_path, fixes)
+    _add_missing_imports(tree, fixes)
+    if not fixes:
+        return None
+    # a block whose only statement was plt.show() must not end up empty
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Module) and getattr(node, "body", None) == []:
+            node.body = [ast.Pass()]
+    return Repair(code=ast.unparse(ast.fix_missing_locations(tree)), fixes=fixes)
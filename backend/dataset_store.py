@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+import pandas as pd
+
+# with copy-on-write, shallow copies handed to nodes share memory with the stored frame
+# but can never modify it in place
+pd.set_option("mode.copy_on_write", True)
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (column names, dtypes and values)"""
+    hasher = hashlib.sha256()
+    hasher.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    # vectorized per-row hashes, then a single digest over the resulting uint64 buffer
+    hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return hasher.hexdigest()[:32]
+
+
+class DatasetNotFoundError(KeyError):
+    """Raised for a dataset_id that is neither in memory nor spilled to disk"""
+
+
+class DatasetStore:
+    """In-process store holding one columnar copy of each DataFrame, keyed by content hash.
+
+    The graph state only carries the returned dataset_id; nodes resolve it with get().
+    Once the frames held in memory exceed max_bytes (their deep memory usage) or max_items, the
+    least recently used ones are spilled to Parquet files under spill_dir (dropped if no spill_dir
+    is set) and read back on demand; the most recent frame always stays, however large. The spill
+    directory itself is capped at max_spill_bytes, oldest files first.
+    """
+
+    def __init__(self, max_items: int = 16, max_bytes: int = 2 * 1024 ** 3, spill_dir: Optional[str] = None,
+                 max_spill_bytes: int = 2 * 1024 ** 3, max_uploads: int = 256):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.max_uploads = max_uploads
+        self._frames: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        # deep memory usage of each in-memory frame and their total
+        self._frame_bytes: dict[str, int] = {}
+        self._total_bytes = 0
+        # evicted frames whose spill file is still being written
+        self._spilling: dict[str, pd.DataFrame] = {}
+        # dataset_id -> (path, size in bytes), least recently used first
+        self._spilled: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        # digest of the raw uploaded bytes -> dataset_id, so identical uploads skip parsing
+        self._uploads: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_spill_index()
+
+    def put(self, df: pd.DataFrame) -> str:
+        """Store df (if not already present) and return its dataset_id"""
+        with self._lock:
+            # the very same object was stored before: skip re-hashing it
+            for dataset_id, frame in self._frames.items():
+                if frame is df:
+                    self._frames.move_to_end(dataset_id)
+                    return dataset_id
+        dataset_id = dataset_fingerprint(df)
+        self._insert(dataset_id, df)
+        return dataset_id
+
+    def get(self, dataset_id: str) -> pd.DataFrame:
+        """Return a zero-copy view of the stored frame (reloading it if spilled); raises DatasetNotFoundError"""
+        with self._lock:
+            df = self._frames.get(dataset_id)
+            if df is None:
+                df = self._spilling.get(dataset_id)
+            else:
+                self._frames.move_to_end(dataset_id)
+            path = self._spilled.get(dataset_id, (None, 0))[0] if df is None else None
+        if df is None:
+            if path is None:
+                raise DatasetNotFoundError(dataset_id)
+            df = self._read_spill(path)
+            self._insert(dataset_id, df)
+        # shallow copy: callers may add/drop columns without touching the stored frame
+        return df.copy(deep=False)
+
+    def __contains__(self, dataset_id: str) -> bool:
+        with self._lock:
+            return dataset_id in self._frames or dataset_id in self._spilling or dataset_id in self._spilled
+
+    def find_upload(self, digest: str) -> Optional[str]:
+        """dataset_id of an earlier upload with the same raw bytes, if it is still stored"""
+        with self._lock:
+            dataset_id = self._uploads.get(digest)
+            if dataset_id is not None:
+                self._uploads.move_to_end(digest)
+        return dataset_id if dataset_id is not None and dataset_id in self else None
+
+    def remember_upload(self, digest: str, dataset_id: str):
+        with self._lock:
+            self._uploads[digest] = dataset_id
+            self._uploads.move_to_end(digest)
+            while len(self._uploads) > self.max_uploads:
+                self._uploads.popitem(last=False)
+
+    def _insert(self, dataset_id: str, df: pd.DataFrame):
+        # deep=True counts the strings behind object columns, which dominate many uploads
+        size = int(df.memory_usage(deep=True).sum())
+        evicted = []
+        with self._lock:
+            if dataset_id in self._frames:
+                self._frames.move_to_end(dataset_id)
+                return
+            self._frames[dataset_id] = df
+            self._frame_bytes[dataset_id] = size
+            self._total_bytes += size
+            while len(self._frames) > 1 and (len(self._frames) > self.max_items
+                                             or self._total_bytes > self.max_bytes):
+                old_id, old_df = self._frames.popitem(last=False)
+                self._total_bytes -= self._frame_bytes.pop(old_id)
+                if self.spill_dir and old_id not in self._spilled:
+                    self._spilling[old_id] = old_df
+                    evicted.append((old_id, old_df))
+        # large frames take a while to write, so do it outside the lock
+        for old_id, old_df in evicted:
+            self._spill(old_id, old_df)
+
+    def _spill(self, dataset_id: str, df: pd.DataFrame):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{dataset_id}.parquet")
+        # write under a temporary name so a crash never leaves a truncated file to be indexed
+        tmp_path = f"{path}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+        except Exception:
+            # mixed-type object columns etc. that Parquet cannot represent
+            path = os.path.join(self.spill_dir, f"{dataset_id}.pkl")
+            df.to_pickle(tmp_path, compression=None)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        removed = []
+        with self._lock:
+            self._spilling.pop(dataset_id, None)
+            self._spilled[dataset_id] = (path, size)
+            total = sum(entry[1] for entry in self._spilled.values())
+            while total > self.max_spill_bytes and len(self._spilled) > 1:
+                _, (old_path, old_size) = self._spilled.popitem(last=False)
+                removed.append(old_path)
+                total -= old_size
+        for old_path in removed:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def _load_spill_index(self):
+        """Spill files are content-addressed, so the ones left by a previous process stay valid"""
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            dataset_id, ext = os.path.splitext(name)
+            if ext in (".parquet", ".pkl"):
+                path = os.path.join(self.spill_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, dataset_id, path, stat.st_size))
+        for _, dataset_id, path, size in sorted(entries):
+            self._spilled[dataset_id] = (path, size)
+
+    @staticmethod
+    def _read_spill(path: str) -> pd.DataFrame:
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+
+# process-wide store shared by the API and the graph nodes
+dataset_store = DatasetStore(
+    max_items=int(os.getenv("DATASET_STORE_MAX_ITEMS", "16")),
+    max_bytes=int(os.getenv("DATASET_STORE_MAX_MB", "2048")) * 1024 * 1024,
+    spill_dir=os.getenv("DATASET_SPILL_DIR", ".cache/datasets") or None,
+    max_spill_bytes=int(os.getenv("DATASET_SPILL_MAX_MB", "2048")) * 1024 * 1024,
+)
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Any, Callable, Optional, Sequence, Union
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+from backend.tokens import count_message_tokens, count_text_tokens
+
+# a scripted response is either the tool-call arguments or a function of the prompt messages
+ScriptedResponse = Union[dict, Callable[[list[BaseMessage]], dict]]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Local chat model that replays scripted structured outputs, for offline tests and benchmarks.
+
+    Supports with_structured_output(): every call answers with a tool call whose arguments are the
+    next scripted response (cycling through the script). Token usage is estimated locally (tiktoken
+    when available, image parts at their vision-token cost) so usage accounting has something to count.
+    """
+
+    responses: list[Any] = Field(default_factory=list)
+    latency: float = 0.0
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    @property
+    def calls(self) -> int:
+        """Number of model invocations so far"""
+        return self._calls
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs: Any):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.bind(tool_names=names, **kwargs)
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        with self._lock:
+            index = self._calls
+            self._calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = self.responses[index % len(self.responses)] if self.responses else {}
+        args = response(messages) if callable(response) else dict(response)
+
+        input_tokens = count_message_tokens(messages)
+        output_tokens = count_text_tokens(str(args))
+        tool_names = kwargs.get("tool_names") or ["response"]
+        message = AIMessage(
+            content="",
+            tool_calls=[{"name": tool_names[0], "args": args, "id": f"call_{index}"}],
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
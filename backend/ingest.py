@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+from backend.profiler import looks_like_datetime
+
+# request body limits for CSV uploads
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "2048")) * 1024 ** 2)
+UPLOAD_MAX_ROWS = int(os.getenv("UPLOAD_MAX_ROWS", "20000000"))
+UPLOAD_CHUNK_BYTES = 1024 ** 2
+# rows read with pandas to choose column types for the full parse
+DTYPE_SAMPLE_ROWS = int(os.getenv("UPLOAD_DTYPE_SAMPLE_ROWS", "50000"))
+# string columns load as categoricals when the sample has few distinct values
+CATEGORY_MAX_UNIQUE = 10000
+CATEGORY_MAX_RATIO = 0.5
+# bytes of CSV per parsed record batch
+CSV_BLOCK_BYTES = 8 * 1024 ** 2
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds UPLOAD_MAX_MB or UPLOAD_MAX_ROWS"""
+
+    status_code = 413
+
+
+def hash_upload(handle, max_bytes: int = UPLOAD_MAX_BYTES) -> tuple[str, int]:
+    """sha256 and size of an uploaded binary file object, read in chunks; leaves it rewound for parsing"""
+    hasher = hashlib.sha256()
+    size = 0
+    handle.seek(0)
+    while chunk := handle.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds the {max_bytes / 1024 ** 2:g} MB limit.")
+        hasher.update(chunk)
+    handle.seek(0)
+    return hasher.hexdigest(), size
+
+
+def sample_column_types(sample: pd.DataFrame) -> dict:
+    """Arrow type per column chosen from a pandas-parsed sample: low-cardinality strings become dictionaries"""
+    types = {}
+    for name, series in sample.items():
+        if pd.api.types.is_bool_dtype(series):
+            types[name] = pa.bool_()
+        elif pd.api.types.is_integer_dtype(series):
+            types[name] = pa.int64()
+        elif pd.api.types.is_float_dtype(series):
+            types[name] = pa.float64()
+        else:
+            unique = series.nunique()
+            # date strings stay plain so the profiler still recognises them
+            if unique <= CATEGORY_MAX_UNIQUE and unique <= CATEGORY_MAX_RATIO * max(len(series), 1) \
+                    and not looks_like_datetime(series):
+                types[name] = pa.dictionary(pa.int32(), pa.string())
+            else:
+                types[name] = pa.string()
+    return types
+
+
+def _rewind(source):
+    """Each parse pass reads a file object from its start"""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def relax_column_type(kind: pa.DataType) -> Optional[pa.DataType]:
+    """The next, more permissive type for a column whose sampled type a later value contradicts"""
+    if kind == pa.int64():
+        return pa.float64()
+    if kind in (pa.float64(), pa.bool_()):
+        return pa.string()
+    return None
+
+
+def read_csv_compact(source, max_rows: int = UPLOAD_MAX_ROWS) -> pd.DataFrame:
+    """Parse a CSV (path or seekable binary file object) into a DataFrame with compact dtypes.
+
+    Column types come from a pandas-parsed sample; the file is then streamed through pyarrow's
+    multithreaded CSV reader in record batches (stopping at `max_rows`), so peak memory is about
+    the Arrow table plus one column being converted rather than several copies of the raw text.
+    When a later value contradicts a sampled type, only that column is relaxed (int -> float ->
+    string) and the read restarts; malformed files fall back to the pandas C parser.
+    """
+    # the CSV reader is only needed for uploads, not at API start-up
+    import pyarrow.csv as pacsv
+    sample = pd.read_csv(_rewind(source), nrows=DTYPE_SAMPLE_ROWS)
+    columns = [str(column) for column in sample.columns]
+    types = sample_column_types(sample.set_axis(columns, axis=1))
+    while True:
+        batches = []
+        try:
+            reader = pacsv.open_csv(
+                _rewind(source),
+                # pandas' de-duplicated header names, so both parsers agree on the columns
+                read_options=pacsv.ReadOptions(column_names=columns, skip_rows=1, block_size=CSV_BLOCK_BYTES),
+                convert_options=pacsv.ConvertOptions(column_types=types, strings_can_be_null=True),
+            )
+            rows = 0
+            for batch in reader:
+                rows += batch.num_rows
+                if rows > max_rows:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_rows} row limit.")
+                batches.append(batch)
+            table = pa.Table.from_batches(batches, schema=reader.schema).unify_dictionaries()
+            break
+        except pa.ArrowInvalid as e:
+            del batches
+            # e.g. "In CSV column #3: Row #120001: CSV conversion error to int64: invalid value 'n/a'"
+            match = re.match(r"In CSV column #(\d+):", str(e))
+            name = columns[int(match.group(1))] if match else None
+            relaxed = relax_column_type(types[name]) if name is not None else None
+            if relaxed is None:
+                df = pd.read_csv(_rewind(source), nrows=max_rows + 1)
+                if len(df) > max_rows:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_rows} row limit.")
+                return df
+            types[name] = relaxed
+    del batches
+    # integer columns stay int64: generated chart code does arithmetic on them (price * qty,
+    # year * 100 + month) and narrower types would overflow silently
+    # hand the Arrow pool's freed parse buffers back to the OS before pandas allocates the frame
+    pa.default_memory_pool().release_unused()
+    # frees each Arrow column as soon as it is converted
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    for name, series in df.items():
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # sorted like the object column groupby / value order would have been
+            df[name] = series.cat.reorder_categories(sorted(series.cat.categories))
+    pa.default_memory_pool().release_unused()
+    return df
+
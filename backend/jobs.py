@@ -0,0 +1,178 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds the maximum number of pending jobs"""
+
+
+class Job:
+    """Book-keeping for a single queued workflow run"""
+
+    def __init__(self, payload: dict):
+        self.job_id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = QUEUED
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        # HTTP status for a failed job; errors may carry their own (e.g. 503 when the model is unavailable)
+        self.error_status = 500
+        self.cancel_event = threading.Event()
+        # progress events for streaming clients, in emission order
+        self.events: list[dict] = []
+        self._events_lock = threading.Lock()
+        # (event loop, asyncio.Event) of each stream waiting for the next event
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.future = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def emit(self, event: dict):
+        """Record a progress event and wake up any waiting stream on its own event loop"""
+        with self._events_lock:
+            self.events.append(event)
+            waiters = list(self._waiters)
+        for loop, changed in waiters:
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                # the stream's loop has already closed
+                pass
+
+    async def wait_for_events(self, since: int, timeout: float = 1.0) -> list[dict]:
+        """Events after index `since`, waiting up to timeout for new ones without occupying a thread"""
+        changed = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), changed)
+        with self._events_lock:
+            if len(self.events) > since or self.status in FINISHED_STATES:
+                return self.events[since:]
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._events_lock:
+                self._waiters.discard(waiter)
+        with self._events_lock:
+            return self.events[since:]
+
+    def to_dict(self) -> dict:
+        """Serializable status snapshot (without the result payload)"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Run workflow jobs on a bounded thread pool so the event loop never blocks"""
+
+    def __init__(self, runner: Callable[[Job], Any],
+                 max_workers: int = 4, max_queued: int = 32, ttl_seconds: int = 3600):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, payload: dict) -> Job:
+        """Enqueue a payload for the runner and return its job handle"""
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING))
+            if pending >= self.max_workers + self.max_queued:
+                raise QueueFullError("Too many pending analysis jobs, try again later.")
+            job = Job(payload)
+            self._jobs[job.job_id] = job
+            job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued job outright, or ask a running one to stop at the next node"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        # a job that has not been picked up by a worker yet can be dropped immediately
+        if job.future.cancel():
+            self._finish(job, CANCELLED)
+        return job
+
+    def shutdown(self):
+        """Cancel everything pending and stop the worker threads"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.emit({"event": RUNNING})
+        try:
+            result = self.runner(job)
+        except Exception as e:
+            if job.cancel_event.is_set():
+                self._finish(job, CANCELLED)
+            else:
+                job.error_status = getattr(e, "status_code", 500)
+                self._finish(job, FAILED, error=str(e))
+        else:
+            self._finish(job, COMPLETED, result=result)
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        # drop the (possibly large) input payload once it is no longer needed
+        job.payload = None
+        # terminal event closes any open progress stream
+        job.emit({"event": status, "result": result, "error": error})
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window (caller holds the lock)"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED_STATES and job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def job_manager_from_env(runner: Callable[[Job], Any]) -> JobManager:
+    """Build a JobManager sized by ANALYZE_WORKERS / ANALYZE_MAX_QUEUE / JOB_TTL_SECONDS"""
+    return JobManager(
+        runner=runner,
+        max_workers=int(os.getenv("ANALYZE_WORKERS", "4")),
+        max_queued=int(os.getenv("ANALYZE_MAX_QUEUE", "32")),
+        ttl_seconds=int(os.getenv("JOB_TTL_SECONDS", "3600")),
+    )
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+from pydantic import BaseModel
+from backend.metrics import LLM_CACHE_LOOKUPS
+
+# generated chart paths differ per request but do not change what the model should answer
+_CHART_PATH = re.compile(r"charts/[\w./-]+\.png")
+# prompt inputs that carry image data; only their digest goes into the key
+IMAGE_KEYS = ("chart_image",)
+# natural-language inputs whose spacing does not matter; code (previous_code, code_v1) and the
+# schema are keyed verbatim, since Python indentation changes what a program does
+TEXT_KEYS = ("user_query", "feedback")
+
+
+def _normalize(value: Any, collapse_whitespace: bool = False) -> Any:
+    """Canonical form of prompt inputs: masked chart paths, sorted dicts and, for free text, collapsed whitespace"""
+    if isinstance(value, str):
+        if collapse_whitespace:
+            value = " ".join(value.split())
+        return _CHART_PATH.sub("<chart_path>", value)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v, collapse_whitespace) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v, collapse_whitespace) for v in value]
+    return value
+
+
+def cache_key(namespace: str, inputs: dict) -> str:
+    """Content address for a chain call: namespace + normalized inputs (images by digest)"""
+    keyed = {}
+    for name, value in inputs.items():
+        if name in IMAGE_KEYS and value is not None:
+            keyed[name] = hashlib.sha256(str(value).encode("utf-8")).hexdigest()
+        else:
+            keyed[name] = _normalize(value, collapse_whitespace=name in TEXT_KEYS)
+    payload = json.dumps({"namespace": namespace, "inputs": keyed}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Persistent SQLite cache of structured LLM responses with LRU eviction.
+
+    Entries beyond max_entries are evicted least-recently-used first. Hit/miss counters are
+    kept per namespace for the lifetime of the process.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (last_access)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            if row is None:
+                counters["misses"] += 1
+                return None
+            counters["hits"] += 1
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, namespace: str, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, namespace, value, last_access) VALUES (?, ?, ?, ?)",
+                (key, namespace, value, time.time()),
+            )
+            # evict least recently used entries over the size limit
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Hit/miss counters per namespace"""
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self._stats.items()}
+
+
+class CachedChain:
+    """Wrap a structured-output chain so identical calls are answered from the LLMCache"""
+
+    def __init__(self, chain, cache: LLMCache, namespace: str, schema: type[BaseModel]):
+        self.chain = chain
+        self.cache = cache
+        self.namespace = namespace
+        self.schema = schema
+
+    def invoke(self, inputs: dict, config=None, **kwargs) -> BaseModel:
+        key = cache_key(self.namespace, inputs)
+        cached = self.cache.get(self.namespace, key)
+        LLM_CACHE_LOOKUPS.labels(chain=self.namespace, result="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            response = self.schema.model_validate_json(cached)
+            return self._retarget(response, inputs)
+        response = self.chain.invoke(inputs, config, **kwargs)
+        self.cache.put(self.namespace, key, response.model_dump_json())
+        return response
+
+    def _retarget(self, response: BaseModel, inputs: dict) -> BaseModel:
+        """Point chart paths in a cached answer at this call's output path"""
+        out_path = inputs.get("out_path_v1")
+        if not out_path:
+            return response
+        updates = {name: _CHART_PATH.sub(out_path, value)
+                   for name, value in response.model_dump().items() if isinstance(value, str)}
+        return response.model_copy(update=updates)
+
+
+def cache_from_env() -> Optional[LLMCache]:
+    """Build the LLM cache from LLM_CACHE_PATH / LLM_CACHE_MAX_ENTRIES; None when LLM_CACHE=0"""
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    return LLMCache(
+        path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+    )
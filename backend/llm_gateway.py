@@ -0,0 +1,236 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Optional
+import httpx
+from langchain_core.runnables import Runnable
+from backend.metrics import LLM_LIMIT_WAIT_SECONDS, LLM_RETRIES
+from backend.tokens import count_message_tokens, count_text_tokens
+
+# provider errors worth another attempt: rate limits, timeouts, dropped connections and 5xx
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when a model call still fails after the gateway's retries, or runs out of time"""
+
+    # surfaced to API clients as "try again later" rather than a generic 500
+    status_code = 503
+
+
+class LLMDeadlineExceeded(LLMUnavailableError):
+    """Raised when a call cannot get a slot, a rate-limit token or a successful reply before its deadline"""
+
+
+class TokenBucket:
+    """Continuously refilled allowance of `per_minute` units (requests or tokens), bursting up to burst_seconds' worth"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 60.0):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst_seconds
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now); caller holds the limiter lock"""
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        # a single request larger than the whole bucket only has to wait for a full one
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+
+class ModelLimiter:
+    """Concurrency slots plus requests/min and tokens/min buckets for one model"""
+
+    def __init__(self, concurrency: int, rpm: float, tpm: float, burst_seconds: float = 60.0):
+        self.slots = threading.BoundedSemaphore(concurrency)
+        # at least one request must fit, however short the burst window
+        self.requests = TokenBucket(rpm, max(burst_seconds, 60.0 / rpm))
+        self.tokens = TokenBucket(tpm, burst_seconds)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int, deadline: float):
+        """Take one request and `tokens` tokens from the buckets, blocking until both are available"""
+        while True:
+            with self._lock:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait == 0:
+                    # both or neither, so a waiting call never sits on half an allowance
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return
+            if time.monotonic() + wait > deadline:
+                raise LLMDeadlineExceeded("Model rate limit would delay this call past its deadline.")
+            time.sleep(wait)
+
+
+class LLMGateway:
+    """Process-wide entry point for chat model calls.
+
+    Per model it bounds in-flight calls with a semaphore and paces them with requests/min and
+    tokens/min token buckets; failed calls are retried with jittered exponential backoff
+    (honouring Retry-After) until a per-call deadline.
+    """
+
+    def __init__(self, concurrency: int = 8, rpm: float = 500, tpm: float = 30000,
+                 model_limits: Optional[dict] = None, max_retries: int = 6,
+                 backoff_base: float = 0.5, backoff_max: float = 20.0,
+                 deadline_seconds: float = 120.0, expected_output_tokens: int = 500,
+                 burst_seconds: float = 10.0):
+        self.defaults = {"concurrency": concurrency, "rpm": rpm, "tpm": tpm}
+        # providers enforce per-minute limits over shorter windows, so do not spend a minute's allowance at once
+        self.burst_seconds = burst_seconds
+        self.model_limits = model_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline_seconds = deadline_seconds
+        self.expected_output_tokens = expected_output_tokens
+        self._limiters: dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        """Limiter shared by every chain calling `model` (provider limits are per model)"""
+        with self._lock:
+            if model not in self._limiters:
+                limits = {**self.defaults, **self.model_limits.get(model, {})}
+                self._limiters[model] = ModelLimiter(int(limits["concurrency"]), limits["rpm"], limits["tpm"],
+                                                     self.burst_seconds)
+            return self._limiters[model]
+
+    def wrap(self, runnable, model: str) -> "GatedRunnable":
+        """Route a model runnable (e.g. llm.with_structured_output(...)) through the gateway"""
+        return GatedRunnable(bound=runnable, gateway=self, model=model)
+
+    def call(self, model: str, func, prompt_tokens: int):
+        """Run func() under the model's limits, retrying transient provider errors"""
+        deadline = time.monotonic() + self.deadline_seconds
+        limiter = self.limiter(model)
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            # pace first, then take a slot, so slots are never held while waiting for the buckets
+            limiter.acquire(prompt_tokens + self.expected_output_tokens, deadline)
+            if not limiter.slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise LLMDeadlineExceeded(f"No free {model} slot before the call deadline.")
+            LLM_LIMIT_WAIT_SECONDS.labels(model=model).observe(time.monotonic() - start)
+            try:
+                return func()
+            except Exception as e:
+                reason = retry_reason(e)
+                if reason is None:
+                    raise
+                error = e
+            finally:
+                limiter.slots.release()
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise LLMUnavailableError(f"{model} call failed after {self.max_retries} retries: {error}") from error
+            delay = retry_after(error)
+            if delay is None:
+                # full jitter: callers that failed together do not retry together
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if time.monotonic() + delay > deadline:
+                raise LLMDeadlineExceeded(f"{model} call did not succeed before its deadline: {error}") from error
+            LLM_RETRIES.labels(model=model, reason=reason).inc()
+            time.sleep(delay)
+
+
+class GatedRunnable(Runnable):
+    """Model runnable whose invocations go through an LLMGateway"""
+
+    def __init__(self, bound, gateway: LLMGateway, model: str):
+        self.bound = bound
+        self.gateway = gateway
+        self.model = model
+
+    def invoke(self, input, config=None, **kwargs):
+        prompt_tokens = estimate_prompt_tokens(input)
+        return self.gateway.call(self.model, lambda: self.bound.invoke(input, config, **kwargs), prompt_tokens)
+
+
+def estimate_prompt_tokens(prompt: Any) -> int:
+    """Prompt tokens of a PromptValue / message list / string, for the tokens-per-minute bucket"""
+    if hasattr(prompt, "to_messages"):
+        prompt = prompt.to_messages()
+    if isinstance(prompt, list):
+        return count_message_tokens(prompt)
+    return count_text_tokens(str(prompt))
+
+
+def retry_reason(error: Exception) -> Optional[str]:
+    """Metric label for a retryable provider error, None for errors retrying cannot fix"""
+    # the SDK's errors can only exist once something imported it; importing it here would pull the whole SDK into startup
+    openai = sys.modules.get("openai")
+    timeouts = (httpx.TimeoutException, TimeoutError) + ((openai.APITimeoutError,) if openai else ())
+    if isinstance(error, timeouts):
+        return "timeout"
+    connection_errors = (httpx.TransportError, ConnectionError) + ((openai.APIConnectionError,) if openai else ())
+    if isinstance(error, connection_errors):
+        return "connection"
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate_limited"
+    if status in RETRYABLE_STATUS:
+        return "server_error"
+    return None
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Delay requested by the provider's Retry-After / retry-after-ms headers, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+
+def shared_http_client() -> httpx.Client:
+    """One pooled keep-alive HTTP client for every model (LLM_MAX_CONNECTIONS, LLM_REQUEST_TIMEOUT)"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=httpx.Timeout(float(os.getenv("LLM_REQUEST_TIMEOUT", "60")), connect=10.0),
+            )
+        return _http_client
+
+
+def gateway_from_env() -> LLMGateway:
+    """Build the gateway from LLM_MAX_CONCURRENCY / LLM_RPM / LLM_TPM / LLM_MODEL_LIMITS, burst and retry settings"""
+    return LLMGateway(
+        concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        rpm=float(os.getenv("LLM_RPM", "500")),
+        tpm=float(os.getenv("LLM_TPM", "30000")),
+        # per-model overrides, e.g. {"gpt-4o": {"rpm": 5000, "tpm": 800000, "concurrency": 32}}
+        model_limits=json.loads(os.getenv("LLM_MODEL_LIMITS", "{}")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "6")),
+        backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+        backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "20")),
+        deadline_seconds=float(os.getenv("LLM_DEADLINE_SECONDS", "120")),
+        expected_output_tokens=int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "500")),
+        burst_seconds=float(os.getenv("LLM_BURST_SECONDS", "10")),
+    )
+
+
+# process-wide gateway shared by every chain
+llm_gateway = gateway_from_env()
@@ -1,15 +1,156 @@
-from fastapi import FastAPI, UploadFile, Form,Path,File,HTTPException
-from fastapi.responses import JSONResponse,FileResponse
+from fastapi import FastAPI, UploadFile, Form,Path,File,HTTPException,Request
+from fastapi.responses import JSONResponse,FileResponse,Response,StreamingResponse
 import pandas as pd
-import io
 import os
-from typing import Optional
-from backend.agent_backend import run_workflow 
+from typing import Annotated,Optional
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+from backend.agent_backend import run_workflow,registry,llm_cache,WorkflowCancelled
+from backend.sandbox import chart_sandbox
+from backend.chart_render import prime_font_cache,warm_plotting
+from backend.tokens import count_text_tokens
+from backend.dataset_store import dataset_store,DatasetNotFoundError
+from backend.ingest import hash_upload,UploadTooLargeError,UPLOAD_MAX_BYTES
+from backend.chart_store import chart_store
+from backend.metrics import record_request_dataset,render_metrics
+from backend.aggregation import PLAN_MODE_MIN_ROWS
+from backend.jobs import job_manager_from_env,Job,QueueFullError,COMPLETED,FAILED,CANCELLED,FINISHED_STATES
 from backend.schema.analyst_state_schema import AnalystState
 from backend.schema.evaluation_rubric_schema import EvaluationCriteria
 from backend.utils import *    
 
-app = FastAPI(title="Agentic BI Analyst API")
+def analysis_result(initial_state:AnalystState,final_state:AnalystState) -> dict:
+    """Response payload of one finished workflow"""
+    return {
+        "query": initial_state["user_query"],
+        "charts": final_state.get("chart_path"),
+        "rubric_feedback": final_state.get("rubric"),
+        "candidates": final_state.get("candidates"),
+        "aggregation_spec": final_state.get("aggregation_spec"),
+        # generator prompt tokens per iteration
+        "prompt_tokens": final_state.get("prompt_tokens")
+    }
+
+def run_analysis(job:Job) -> dict:
+    """Worker entry point: run the LangGraph workflow for one queued /analyze request"""
+    if "batch" in job.payload:
+        return run_batch(job)
+    initial_state = job.payload["initial_state"]
+    # every node transition is recorded on the job for streaming clients
+    final_state = run_workflow(initial_state,cancel_event=job.cancel_event,
+                               on_event=lambda event: job.emit({"event":"node",**event}))
+
+    # Prepare response
+    return analysis_result(initial_state,final_state)
+
+def run_batch(job:Job) -> dict:
+    """Worker entry point for /analyze/batch: fan the queries over one dataset out to a bounded pool"""
+    batch = job.payload["batch"]
+    states = batch["initial_states"]
+    results = [None] * len(states)
+
+    def run_one(index:int):
+        state = states[index]
+        outcome = {"index":index,"query":state["user_query"]}
+        try:
+            # queries still waiting for a slot when the batch is cancelled never start
+            if job.cancel_event.is_set():
+                raise WorkflowCancelled("Workflow cancelled by user.")
+            final_state = run_workflow(state,cancel_event=job.cancel_event,
+                                       on_event=lambda event: job.emit({"event":"node","index":index,**event}))
+            outcome.update(status=COMPLETED,**analysis_result(state,final_state))
+        except WorkflowCancelled as e:
+            outcome.update(status=CANCELLED,error=str(e))
+        except Exception as e:
+            # one failing chart does not sink the rest of the report pack
+            outcome.update(status=FAILED,error=str(e))
+        results[index] = outcome
+        job.emit({"event":"query",**outcome})
+
+    with ThreadPoolExecutor(max_workers=batch["concurrency"],thread_name_prefix="batch") as pool:
+        list(pool.map(run_one,range(len(states))))
+    if job.cancel_event.is_set():
+        raise WorkflowCancelled("Batch cancelled by user.")
+    return {"dataset_id":batch["dataset_id"],"results":results}
+
+job_manager = job_manager_from_env(run_analysis)
+CHART_CACHE_SECONDS = int(os.getenv("CHART_CACHE_SECONDS", "3600"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# report packs: queries per /analyze/batch call and how many of them run at once
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# warm the plotting stack, tokenizer and sandbox workers before accepting traffic; the sandbox wait is bounded
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP","1") != "0"
+SANDBOX_WARMUP_TIMEOUT = float(os.getenv("SANDBOX_WARMUP_TIMEOUT","60"))
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    if STARTUP_WARMUP:
+        # one font-cache build here instead of one per freshly spawned worker; without a sandbox
+        # charts render in this process, so warm the whole plotting stack
+        await run_in_threadpool(prime_font_cache if chart_sandbox is not None else warm_plotting)
+    # pre-fork the chart execution workers so the first request does not pay for them;
+    # they import and warm up in their own processes while this one loads the models
+    if chart_sandbox is not None:
+        await run_in_threadpool(chart_sandbox.start)
+    # compile the agent and load prompts/chains (and the model clients) once before serving traffic
+    await run_in_threadpool(registry.load)
+    if STARTUP_WARMUP:
+        # loads the tokenizer used for prompt budgets
+        await run_in_threadpool(count_text_tokens,"warm-up")
+        if chart_sandbox is not None:
+            await run_in_threadpool(chart_sandbox.wait_ready,SANDBOX_WARMUP_TIMEOUT)
+    yield
+    # stop accepting work and cancel whatever is still pending
+    job_manager.shutdown()
+    if chart_sandbox is not None:
+        chart_sandbox.shutdown()
+
+app = FastAPI(title="Agentic BI Analyst API",lifespan=lifespan)
+
+# allowance for the multipart boundaries and the other form fields
+REQUEST_MAX_BYTES = UPLOAD_MAX_BYTES + 1024 ** 2
+
+class RequestTooLargeError(HTTPException):
+    """Raised from the request stream once a body passes REQUEST_MAX_BYTES"""
+
+class LimitRequestSize:
+    """Reject oversized request bodies before they are spooled to disk: bodies declared too large
+    (Content-Length) up front, chunked ones as soon as the bytes read so far cross the limit"""
+
+    def __init__(self,app,max_bytes:int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self,scope,receive,send):
+        if scope["type"] != "http":
+            return await self.app(scope,receive,send)
+        message = f"Upload exceeds the {UPLOAD_MAX_BYTES / 1024 ** 2:g} MB limit."
+        length = dict(scope["headers"]).get(b"content-length",b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await JSONResponse(status_code=413,content={"error": message})(scope,receive,send)
+        received = 0
+
+        async def counting_receive():
+            nonlocal received
+            event = await receive()
+            if event["type"] == "http.request":
+                received += len(event.get("body",b""))
+                if received > self.max_bytes:
+                    # an HTTPException passes FastAPI's form parsing unchanged
+                    raise RequestTooLargeError(status_code=413,detail=message)
+            return event
+
+        await self.app(scope,counting_receive,send)
+
+app.add_middleware(LimitRequestSize,max_bytes=REQUEST_MAX_BYTES)
+
+@app.exception_handler(RequestTooLargeError)
+async def request_too_large(request:Request,exc:RequestTooLargeError):
+    return JSONResponse(status_code=413,content={"error": exc.detail})
 
 @app.get("/")
 def welcome():
@@ -18,72 +159,293 @@ def welcome():
 @app.get("/health")
 def healthcheck():
     return {"status": "OK",
-            "version": "1.0"
+            "version": "1.0",
+            "llm_cache": llm_cache.stats() if llm_cache is not None else None
             }
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: node, LLM, chart execution and request metrics"""
+    body,content_type = render_metrics()
+    return Response(content=body,media_type=content_type)
+
+def error_response(e:Exception) -> JSONResponse:
+    """Map an error raised while ingesting a dataset or queueing a job to its JSON response"""
+    if isinstance(e,QueueFullError):
+        return JSONResponse(status_code=503,content={"error": str(e)})
+    if isinstance(e,DatasetNotFoundError):
+        return JSONResponse(status_code=404,content={"error": "Dataset not found; upload the file again."})
+    if isinstance(e,UploadTooLargeError):
+        return JSONResponse(status_code=413,content={"error": str(e)})
+    if isinstance(e,ValueError):
+        return JSONResponse(status_code=400,content={"error": str(e)})
+    return JSONResponse(status_code=500,content={"error": str(e)})
+
+# form fields shared by /analyze, /analyze/batch and their streaming variants
+CsvFileField = Annotated[Optional[UploadFile],File(description="CSV file to analyze (or pass dataset_id)")]
+DatasetIdField = Annotated[Optional[str],Form(description="ID returned by POST /datasets, instead of uploading the file again")]
+MaxRetryField = Annotated[Optional[int],Form(description="No. of retries in case of error or feedback",ge=1,le=7)]
+NumCandidatesField = Annotated[Optional[int],Form(description="Candidate programs generated and evaluated in parallel on the first attempt (best one is refined)",ge=1,le=5)]
+PlanModeField = Annotated[Optional[bool],Form(description="Aggregate the data with a generated spec before plotting; defaults to on for datasets of PLAN_MODE_MIN_ROWS rows or more")]
+QueriesField = Annotated[list[str],Form(description="One chart query per form field; all run against the same dataset")]
+ConcurrencyField = Annotated[Optional[int],Form(description="Queries of this batch that run at the same time",ge=1,le=BATCH_MAX_CONCURRENCY)]
+
+def register_upload(handle):
+    """Hash, parse and profile an uploaded CSV file object once; identical uploads are served from the dataset store"""
+    digest,size = hash_upload(handle)
+    dataset_id = dataset_store.find_upload(digest)
+    if dataset_id is not None:
+        df,schema = load_dataset(dataset_id)
+    else:
+        df,schema = load_csv_data(handle)
+        dataset_id = dataset_store.put(df)
+        dataset_store.remember_upload(digest,dataset_id)
+    record_request_dataset(len(df),size)
+    return dataset_id,df,schema
+
+async def ingest_upload(file:UploadFile):
+    """Register an upload off the event loop, reading the request's spooled temporary file in place"""
+    return await run_in_threadpool(register_upload,file.file)
+
+def dataset_info(dataset_id:str,df:pd.DataFrame,schema:str) -> dict:
+    return {"dataset_id":dataset_id,"rows":len(df),"columns":[str(col) for col in df.columns],"schema":schema}
+
+async def resolve_dataset(file:Optional[UploadFile],dataset_id:Optional[str]):
+    """dataset_id, DataFrame and schema of a registered id or a fresh upload"""
+    # Parse/profile off the event loop; the frame itself stays in the dataset store
+    if dataset_id:
+        df,schema = await run_in_threadpool(load_dataset,dataset_id)
+        record_request_dataset(len(df))
+        return dataset_id,df,schema
+    if file is not None:
+        return await ingest_upload(file)
+    raise ValueError("Provide either a CSV file or a dataset_id from POST /datasets.")
+
+def build_initial_state(dataset_id:str,df:pd.DataFrame,schema:str,user_query:str,max_retry:int,
+                        num_candidates:int=1,plan_mode:Optional[bool]=None) -> AnalystState:
+    return {
+        "user_query": user_query,
+        "dataset_id": dataset_id,
+        "schema": schema,
+        "max_retry": max_retry,
+        "rubric": None,
+        "chart_code": None,
+        "chart_path": None,
+        "run_id": chart_store.new_namespace(),
+        "num_candidates": num_candidates,
+        # aggregate-then-plot for large datasets unless the client chose explicitly
+        "plan_mode": plan_mode if plan_mode is not None else len(df) >= PLAN_MODE_MIN_ROWS,
+    }
+
+async def submit_analysis(file:Optional[UploadFile],dataset_id:Optional[str],user_query:str,max_retry:int,
+                          num_candidates:int=1,plan_mode:Optional[bool]=None) -> Job:
+    """Resolve the dataset (registered id or fresh upload), then queue the workflow on the bounded worker pool"""
+    dataset_id,df,schema = await resolve_dataset(file,dataset_id)
+
+    # Define initial state
+    initial_state = build_initial_state(dataset_id,df,schema,user_query,max_retry,num_candidates,plan_mode)
+
+    # evict old charts now and then instead of wiping the folder before every run
+    await run_in_threadpool(chart_store.maybe_cleanup)
+
+    # Queue the LangGraph workflow on the bounded worker pool
+    return job_manager.submit({"initial_state":initial_state})
+
+async def submit_batch(file:Optional[UploadFile],dataset_id:Optional[str],queries:list[str],max_retry:int,
+                       num_candidates:int=1,plan_mode:Optional[bool]=None,concurrency:int=BATCH_CONCURRENCY) -> Job:
+    """Parse and profile the dataset once, then queue all queries as a single batch job"""
+    queries = [query.strip() for query in queries if query and query.strip()]
+    if not queries:
+        raise ValueError("Provide at least one query.")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise ValueError(f"A batch holds at most {BATCH_MAX_QUERIES} queries.")
+    dataset_id,df,schema = await resolve_dataset(file,dataset_id)
+
+    # every query gets its own chart namespace but shares the stored frame and its profile
+    initial_states = [build_initial_state(dataset_id,df,schema,query,max_retry,num_candidates,plan_mode)
+                      for query in queries]
+    await run_in_threadpool(chart_store.maybe_cleanup)
+    return job_manager.submit({"batch":{"dataset_id":dataset_id,"initial_states":initial_states,
+                                        "concurrency":min(concurrency,len(queries))}})
+
+@app.post("/datasets")
+async def upload_dataset(file: UploadFile = File(...,description="CSV file to register")):
+    """
+    Upload a CSV once and get a dataset_id (content hash) to pass to /analyze for any number of queries.
+    The parsed frame stays in a bounded in-memory LRU that spills to Parquet on disk.
+    """
+    try:
+        dataset_id,df,schema = await ingest_upload(file)
+    except Exception as e:
+        return error_response(e)
+    return JSONResponse(status_code=201,content=dataset_info(dataset_id,df,schema))
+
+@app.get("/datasets/{dataset_id}")
+async def get_dataset(dataset_id:str):
+    """Rows, columns and profiled schema of a registered dataset"""
+    try:
+        df,schema = await run_in_threadpool(load_dataset,dataset_id)
+    except DatasetNotFoundError:
+        return JSONResponse(status_code=404,content={"error": "Dataset not found."})
+    return dataset_info(dataset_id,df,schema)
+
+async def job_event_stream(job:Job):
+    """Server-Sent Events for a job until it completes, fails or is cancelled"""
+    sent = 0
+    while True:
+        # waits on the event loop, so idle streams do not tie up threadpool threads
+        events = await job.wait_for_events(sent,SSE_KEEPALIVE_SECONDS)
+        if not events:
+            # comment line keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            continue
+        for event in events:
+            sent += 1
+            yield format_sse(event)
+            if event["event"] in FINISHED_STATES:
+                return
+
 @app.post("/analyze")
 async def analyze(
-    file: UploadFile = File(...,description="CSV file to analyze"),
+    file: CsvFileField = None,
+    dataset_id: DatasetIdField = None,
     user_query: str = Form(...,description="User query to plot a chart"),
-    max_retry: Optional[int] = Form(description="No. of retries in case of error or feedback",default=3,ge=1,le=7)
+    max_retry: MaxRetryField = 3,
+    num_candidates: NumCandidatesField = 1,
+    plan_mode: PlanModeField = None
 ):
     """
-    Upload a CSV, specify a text query and max retry limit.
-    Returns the generated charts and rubric feedback.
+    Upload a CSV (or reference one registered via POST /datasets), specify a text query, max retry limit
+    and optionally a best-of-N candidate count.
+    Enqueues the workflow and returns a job ID; poll /jobs/{job_id} for status and results.
     """
     try:
-        # Load CSV into pandas DataFrame
-        contents = await file.read()
-        
-        # Extract schema and convert df to dict for LLM consumption
-        df,schema = load_csv_data(io.BytesIO(contents)) 
-        #data = df.head(5).to_dict(orient="records")
-        data = df.to_dict(orient="records")
-
-        # Define initial state
-        initial_state: AnalystState = {
-            "user_query": user_query,
-            "data": data,
-            "schema": schema,
-            "max_retry": max_retry,
-            "rubric": None,
-            "chart_code": None,
-            "chart_path": None,
-        }
-
-        # Run the LangGraph workflow
-        final_state = run_workflow(initial_state)
-
-        # Serialize rubric for readability (convert Pydantic -> dict)
-        #rubric_list = serialize_rubric(final_state.get("rubric"), final_state)
-        #print(rubric_list)
-
-        # Prepare response
-        response = {
-            "query": user_query,
-            "charts": final_state.get("chart_path"),
-            "rubric_feedback": final_state.get("rubric")
-        }
-
-        return JSONResponse(status_code=200,content={'response':response})
+        job = await submit_analysis(file,dataset_id,user_query,max_retry,num_candidates,plan_mode)
+    except Exception as e:
+        return error_response(e)
+    return JSONResponse(status_code=202,content=job.to_dict())
 
+@app.post("/analyze/stream")
+async def analyze_stream(
+    file: CsvFileField = None,
+    dataset_id: DatasetIdField = None,
+    user_query: str = Form(...,description="User query to plot a chart"),
+    max_retry: MaxRetryField = 3,
+    num_candidates: NumCandidatesField = 1,
+    plan_mode: PlanModeField = None
+):
+    """
+    Same inputs as /analyze, but streams every LangGraph node transition as a Server-Sent Event
+    (generated code, chart path, rubric, elapsed seconds) followed by the final result.
+    """
+    try:
+        job = await submit_analysis(file,dataset_id,user_query,max_retry,num_candidates,plan_mode)
     except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"error": str(e)}
-        )
+        return error_response(e)
 
-@app.get("/charts/{chart_path}")
-def display_chart(chart_path:str = Path(...,description="Name of the chart file",example="chart_v0.png")):
+    return StreamingResponse(job_event_stream(job),media_type="text/event-stream",
+                             headers={"Cache-Control":"no-cache","X-Job-Id":job.job_id})
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    queries: QueriesField,
+    file: CsvFileField = None,
+    dataset_id: DatasetIdField = None,
+    max_retry: MaxRetryField = 3,
+    num_candidates: NumCandidatesField = 1,
+    plan_mode: PlanModeField = None,
+    concurrency: ConcurrencyField = BATCH_CONCURRENCY
+):
+    """
+    Run a report pack: many queries against one dataset, parsed and profiled once.
+    Returns a job ID; /jobs/{job_id}/result holds one result per query (in request order) and
+    /jobs/{job_id}/events streams a "query" event as each one finishes.
+    """
+    try:
+        job = await submit_batch(file,dataset_id,queries,max_retry,num_candidates,plan_mode,concurrency)
+    except Exception as e:
+        return error_response(e)
+    return JSONResponse(status_code=202,content=job.to_dict())
+
+@app.post("/analyze/batch/stream")
+async def analyze_batch_stream(
+    queries: QueriesField,
+    file: CsvFileField = None,
+    dataset_id: DatasetIdField = None,
+    max_retry: MaxRetryField = 3,
+    num_candidates: NumCandidatesField = 1,
+    plan_mode: PlanModeField = None,
+    concurrency: ConcurrencyField = BATCH_CONCURRENCY
+):
+    """
+    Same inputs as /analyze/batch, but streams node transitions (tagged with the query index)
+    and a "query" event per finished query as Server-Sent Events, followed by the batch result.
+    """
+    try:
+        job = await submit_batch(file,dataset_id,queries,max_retry,num_candidates,plan_mode,concurrency)
+    except Exception as e:
+        return error_response(e)
+
+    return StreamingResponse(job_event_stream(job),media_type="text/event-stream",
+                             headers={"Cache-Control":"no-cache","X-Job-Id":job.job_id})
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id:str = Path(...,description="ID returned by /analyze")):
+    """Return the current status of an analysis job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404,content={"error":"Job not found."})
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id:str = Path(...,description="ID returned by /analyze")):
+    """Return the generated charts and rubric feedback of a finished job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404,content={"error":"Job not found."})
+    if job.status == COMPLETED:
+        return JSONResponse(status_code=200,content={'response':job.result})
+    if job.status == FAILED:
+        return JSONResponse(status_code=job.error_status,content={"error": job.error})
+    if job.status == CANCELLED:
+        return JSONResponse(status_code=409,content={"error":"Job was cancelled."})
+    # still queued or running
+    return JSONResponse(status_code=202,content=job.to_dict())
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id:str = Path(...,description="ID returned by /analyze")):
+    """Stream (or replay) the progress events of a job as Server-Sent Events"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404,content={"error":"Job not found."})
+    return StreamingResponse(job_event_stream(job),media_type="text/event-stream",
+                             headers={"Cache-Control":"no-cache"})
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id:str = Path(...,description="ID returned by /analyze")):
+    """Cancel a queued job, or stop a running one after its current node"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404,content={"error":"Job not found."})
+    return job.to_dict()
+
+@app.get("/charts/{chart_path:path}")
+def display_chart(request:Request,chart_path:str = Path(...,description="Path of the chart file inside the charts folder",example="3f2a9c/chart_v0.png")):
     """Display chart as image if present"""
 
-    file_path = os.path.join("charts",chart_path)
-    # check if file exists
-    if os.path.exists(file_path):
-        # display chart
-        return FileResponse(path=file_path,media_type="image/png")
-    else:
+    # full-resolution files are written after the evaluator preview, so briefly wait for pending ones
+    file_path = chart_store.wait_for(chart_path)
+    # check if file exists (and lives inside the charts folder)
+    if file_path is None:
         return JSONResponse(status_code=404,content={"error":"Chart not found."})
+
+    # chart versions are never rewritten once their run has finished, so let clients cache them
+    etag = chart_store.etag(file_path)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={CHART_CACHE_SECONDS}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304,headers=headers)
+    # display chart
+    return FileResponse(path=file_path,media_type="image/png",headers=headers)
     
 @app.delete("/charts/delete")
 def delete():
@@ -0,0 +1,112 @@
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# seconds; LLM calls and full workflows run far longer than local work
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+NODE_SECONDS = Histogram("bi_analyst_node_seconds", "Time spent in each LangGraph node",
+                         ["node"], buckets=SLOW_BUCKETS)
+LLM_CALL_SECONDS = Histogram("bi_analyst_llm_call_seconds", "Latency of chat model calls (cache hits excluded)",
+                             ["chain"], buckets=SLOW_BUCKETS)
+LLM_TOKENS = Counter("bi_analyst_llm_tokens", "Tokens reported by the chat model",
+                     ["chain", "kind"])
+PROMPT_TOKENS = Histogram("bi_analyst_prompt_tokens", "Tokens of each generator/planner prompt as sent",
+                          ["chain"], buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000))
+LLM_CACHE_LOOKUPS = Counter("bi_analyst_llm_cache_lookups", "LLM response cache lookups",
+                            ["chain", "result"])
+LLM_RETRIES = Counter("bi_analyst_llm_retries", "Model calls retried by the LLM gateway",
+                      ["model", "reason"])
+LLM_LIMIT_WAIT_SECONDS = Histogram("bi_analyst_llm_limit_wait_seconds",
+                                   "Time a model call waited for a concurrency slot and rate-limit tokens",
+                                   ["model"], buckets=FAST_BUCKETS + (30, 60))
+CHART_EXEC_SECONDS = Histogram("bi_analyst_chart_exec_seconds", "Execution time of generated chart code",
+                               ["status"], buckets=FAST_BUCKETS + (30, 60))
+CODE_REPAIRS = Counter("bi_analyst_code_repairs", "Rule-based repairs of failed chart code re-executed before an LLM retry",
+                       ["outcome"])
+AGGREGATION_SECONDS = Histogram("bi_analyst_aggregation_seconds", "Execution time of plan-mode aggregation specs",
+                                buckets=FAST_BUCKETS)
+IMAGE_ENCODE_SECONDS = Histogram("bi_analyst_image_encode_seconds", "Time to encode a chart for the evaluator",
+                                 buckets=FAST_BUCKETS)
+WORKFLOW_SECONDS = Histogram("bi_analyst_workflow_seconds", "End-to-end run_workflow duration",
+                             ["status"], buckets=SLOW_BUCKETS)
+WORKFLOW_RETRIES = Histogram("bi_analyst_workflow_retries", "Chart generation retries per request",
+                             buckets=(0, 1, 2, 3, 4, 5, 6, 7))
+REQUEST_ROWS = Histogram("bi_analyst_request_rows", "Rows in the dataset of each request, uploaded or referenced by dataset_id",
+                         buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 5e6, 1e7))
+REQUEST_BYTES = Histogram("bi_analyst_request_bytes", "Size of each uploaded CSV in bytes, including re-uploads of a stored dataset",
+                          buckets=(1e4, 1e5, 1e6, 1e7, 1e8, 5e8, 1e9))
+
+
+@contextmanager
+def timer(histogram, **labels):
+    """Observe the duration of the with-block on a histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(**labels) if labels else histogram
+        target.observe(time.perf_counter() - start)
+
+
+def timed_node(node: str):
+    """Decorator recording a graph node's duration under bi_analyst_node_seconds"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(NODE_SECONDS, node=node):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Time chat model calls and count the tokens they report"""
+
+    def __init__(self, chain: str):
+        self.chain = chain
+        self._started: dict[Any, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_CALL_SECONDS.labels(chain=self.chain).observe(time.perf_counter() - started)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.labels(chain=self.chain, kind="input").inc(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(chain=self.chain, kind="output").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+
+def record_workflow(status: str, elapsed: float, final_state: Optional[dict] = None):
+    """Request-level metrics: duration and how many extra chart iterations it took"""
+    WORKFLOW_SECONDS.labels(status=status).observe(elapsed)
+    if final_state is not None:
+        iterations = len(final_state.get("chart_path") or [])
+        WORKFLOW_RETRIES.observe(max(iterations - 1, 0))
+
+
+def record_request_dataset(rows: int, size_bytes: Optional[int] = None):
+    """Dataset size of one request; size_bytes only when the request uploaded the CSV"""
+    REQUEST_ROWS.observe(rows)
+    if size_bytes is not None:
+        REQUEST_BYTES.observe(size_bytes)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Prometheus text exposition of the default registry and its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,136 @@
+import os
+import re
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Optional
+import pandas as pd
+from backend.dataset_store import dataset_fingerprint
+
+# profile at most this many rows; larger frames are profiled on a uniform sample
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "200000"))
+# columns with at most this many distinct values are treated as categories
+CATEGORY_MAX_CARDINALITY = 20
+TOP_K = 5
+
+_DATE_LIKE = re.compile(r"^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}")
+
+
+def _to_builtin(value):
+    """Convert numpy/pandas scalars to JSON-friendly python values"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def looks_like_datetime(series: pd.Series) -> bool:
+    """Cheap check on a small sample whether an object column holds dates"""
+    sample = series.dropna().astype(str).head(200)
+    if sample.empty or not sample.str.match(_DATE_LIKE).all():
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+    return parsed.notna().mean() >= 0.9
+
+
+def _column_kind(series: pd.Series, cardinality: int, non_null: int) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "boolean"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if pd.api.types.is_numeric_dtype(series):
+        if cardinality <= CATEGORY_MAX_CARDINALITY:
+            return "categorical"
+        if pd.api.types.is_integer_dtype(series) and cardinality == non_null:
+            return "identifier"
+        return "numeric"
+    # cardinality only: uploads load many string columns as pandas categoricals to save memory
+    if cardinality <= CATEGORY_MAX_CARDINALITY:
+        return "categorical"
+    if looks_like_datetime(series):
+        return "datetime"
+    if non_null and cardinality == non_null:
+        return "identifier"
+    return "text"
+
+
+def profile_dataframe(df: pd.DataFrame, sample_rows: int = PROFILE_SAMPLE_ROWS, top_k: int = TOP_K) -> dict:
+    """Per-column statistics: kind, cardinality, null rate, min/max and top-k values"""
+    sampled = len(df) > sample_rows
+    frame = df.sample(n=sample_rows, random_state=0) if sampled else df
+
+    # whole-frame vectorized passes
+    cardinality = frame.nunique(dropna=True)
+    non_null = frame.notna().sum()
+    null_rate = frame.isna().mean() if len(frame) else pd.Series(0.0, index=frame.columns)
+    numeric = frame.select_dtypes(include=["number", "datetime"]).columns
+
+    columns = {}
+    for col in frame.columns:
+        series = frame[col]
+        kind = _column_kind(series, int(cardinality[col]), int(non_null[col]))
+        info = {
+            "dtype": str(series.dtype),
+            "kind": kind,
+            "cardinality": int(cardinality[col]),
+            "null_rate": round(float(null_rate[col]), 4),
+        }
+        if col in numeric:
+            # per column so integer columns are not upcast to a common float dtype
+            info["min"] = _to_builtin(series.min())
+            info["max"] = _to_builtin(series.max())
+        if kind in ("categorical", "boolean", "text"):
+            counts = series.value_counts(dropna=True).head(top_k)
+            info["top"] = [[_to_builtin(value), int(count)] for value, count in counts.items()]
+        columns[str(col)] = info
+
+    return {"rows": len(df), "sampled": sampled, "columns": columns}
+
+
+def summarize_profile(profile: dict) -> str:
+    """Compact, prompt-friendly table of a dataset profile"""
+    note = " (statistics from a sample)" if profile["sampled"] else ""
+    lines = [f"rows: {profile['rows']}{note}",
+             "column | kind | dtype | distinct | nulls | range / top values"]
+    for name, info in profile["columns"].items():
+        if "top" in info:
+            detail = ", ".join(f"{value}({count})" for value, count in info["top"])
+        elif "min" in info:
+            detail = f"{info['min']} .. {info['max']}"
+        else:
+            detail = ""
+        lines.append(f"{name} | {info['kind']} | {info['dtype']} | {info['cardinality']} | "
+                     f"{info['null_rate']:.0%} | {detail}")
+    return "\n".join(lines)
+
+
+class ProfileCache:
+    """LRU cache of dataset profiles keyed by dataset content hash"""
+
+    def __init__(self, max_items: int = 64):
+        self.max_items = max_items
+        self._profiles: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_profile(self, df: pd.DataFrame, dataset_id: Optional[str] = None) -> dict:
+        """Return the cached profile for df, computing it on the first request only"""
+        dataset_id = dataset_id or dataset_fingerprint(df)
+        with self._lock:
+            if dataset_id in self._profiles:
+                self._profiles.move_to_end(dataset_id)
+                return self._profiles[dataset_id]
+        profile = profile_dataframe(df)
+        with self._lock:
+            self._profiles[dataset_id] = profile
+            while len(self._profiles) > self.max_items:
+                self._profiles.popitem(last=False)
+        return profile
+
+
+# process-wide profile cache
+profile_cache = ProfileCache(max_items=int(os.getenv("PROFILE_CACHE_MAX_ITEMS", "64")))
@@ -1,38 +1,48 @@
-from langchain_core.prompts import PromptTemplate
+from langchain_core.load import dumps
+from langchain_core.prompts import ChatPromptTemplate
 
-template = """
+system_template = """
     You are an expert data visualization evaluator.\n
     Your task: Critique given IMAGE and original code for correctness based on user query.\n\
     You will receive:\n
     - The user query describing the intended visualization.\n
     - The dataset schema (column names and data types).\n
     - The chart generation code.\n\n
-    - The generated chart 
+    - The generated chart image (attached)
     Evaluate the chart on the following True/False criteria:\n
     1. **relevance** — Does this chart accurately address the user’s query intent?\n
     2. **correct_data_mapping** — Are the axes and data encodings mapped correctly based on the dataset schema?\n
     3. **appropriate_chart_type** — Is the chosen chart type suitable for representing the data requested in the query?\n
     4. **has_clear_title** - Does this chart have clear title?\n
-    5. **has_axis_labels** - 
-    6. **has_legend_if_needed** - 
-    7. **has_clarity** - 
+    5. **has_axis_labels** -
+    6. **has_legend_if_needed** -
+    7. **has_clarity** -
     Then, provide a short feedback paragraph explaining your reasoning or any mistakes you notice.\n\n
     Return your response as a JSON object.
+    """
 
+human_template = """
     chart generation code (for context):
     {code_v1}
 
-    chart image:
-    {chart_image}
-
     user query:
     {user_query}
 
     dataset schema (columns available in df):
     {schema}
+
+    chart image: attached below.
     """
 
-prompt = PromptTemplate(template=template,
-                        input_variables=["code_v1","chart_image","user_query","schema"])
+# the chart goes to the model as an image part, not as base64 text inside the prompt
+prompt = ChatPromptTemplate.from_messages([
+    ("system", system_template),
+    ("human", [
+        {"type": "text", "text": human_template},
+        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,{chart_image}", "detail": "{image_detail}"}},
+    ]),
+])
 
-prompt.save("backend/prompts/evaluator_prompt.json")
+# ChatPromptTemplate has no save(); store its serialized form for load_prompt_file()
+with open("backend/prompts/evaluator_prompt.json", "w", encoding="utf-8") as f:
+    f.write(dumps(prompt, pretty=True))
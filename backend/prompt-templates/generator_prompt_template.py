@@ -13,10 +13,16 @@ template = """
 
     User Query : {user_query}
     The code should create a visualization from the DataFrame 'df' with the following schema:
-    schema: {schema}
+    {schema}
+
+    Previous code:
+    {previous_code}
+
+    Feedback on the previous code:
+    {feedback}
 
     Requirements for the code:
-    1. Revise and return improved code by incorporating given feedback {feedback} if present.
+    1. If there is previous code, revise it to fix every issue in the feedback rather than starting over.
     2. Assume the DataFrame is already loaded as 'df'.
     3. Use seaborn/matplotlib for plotting.
     4. Add clear title, axis labels, and legend if needed.
@@ -24,11 +30,12 @@ template = """
     6. Do not call plt.show().
     7. Close all plots with plt.close().
     8. Add all necessary import python statements
+    9. Columns with dtype 'category' are pandas categoricals: pass observed=True to groupby and pivot_table.
     
     Return ONLY the code wrapped in <execute_python> tags.
     """
 
 prompt = PromptTemplate(template=template,
-                        input_variables=["user_query","schema","feedback","out_path_v1"])
+                        input_variables=["user_query","schema","previous_code","feedback","out_path_v1"])
 
 prompt.save("backend/prompts/generator_prompt.json")
\ No newline at end of file
@@ -0,0 +1,54 @@
+from langchain_core.prompts import PromptTemplate
+
+template = """
+    You are a data visualization expert working with a very large dataset.
+
+    Plotting code never sees the full data. Instead you first declare how to reduce it and the
+    backend executes that reduction; your plotting code then receives only the small result.
+
+    User Query : {user_query}
+    The full DataFrame has the following schema:
+    {schema}
+
+    Previous spec and code:
+    {previous_code}
+
+    Feedback on the previous spec and code:
+    {feedback}
+
+    Return two things:
+
+    1. spec - the aggregation spec:
+       - filters: row filters (column, op, value) combined with AND.
+       - bins: bucket numeric columns (bins=N equal-width bins) or datetime columns
+         (freq one of D, W, M, Q, Y); refer to a bin in group_by by its alias.
+       - group_by: grouping columns and/or bin aliases.
+       - measures: aggregates per group (agg one of count, sum, mean, median, min, max, nunique, std);
+         a count without a column counts rows. Give every measure a readable alias.
+       - sort_by / limit: keep only the top groups, e.g. for rankings.
+       - For plots of individual points (scatter), leave measures empty and set sample_size.
+       Keep the result small: it should have one row per bar/point/line segment you draw.
+
+    2. code - plotting code for the result, *strictly* in this format:
+
+    <execute_python>
+    # valid python code here
+    </execute_python>
+
+    Requirements for the code:
+    1. If there is a previous spec and code, revise them to fix every issue in the feedback.
+    2. The DataFrame 'df' is already loaded and holds ONLY the aggregated result: its columns are the
+       group_by columns followed by the measure aliases (or the sampled rows when there are no measures).
+       Do not aggregate, resample or bootstrap again (e.g. use errorbar=None in seaborn).
+    3. Use seaborn/matplotlib for plotting.
+    4. Add clear title, axis labels, and legend if needed.
+    5. Save the figure as '{out_path_v1}' with dpi=300.
+    6. Do not call plt.show().
+    7. Close all plots with plt.close().
+    8. Add all necessary import python statements
+    """
+
+prompt = PromptTemplate(template=template,
+                        input_variables=["user_query","schema","previous_code","feedback","out_path_v1"])
+
+prompt.save("backend/prompts/planner_prompt.json")
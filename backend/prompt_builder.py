@@ -0,0 +1,118 @@
+import json
+import os
+import re
+from typing import Optional
+from backend.schema.evaluation_rubric_schema import EvaluationCriteria
+from backend.tokens import count_text_tokens
+from backend.utils import extract_python_code
+
+# best-effort ceiling for one generator/planner prompt; optional parts are shrunk to fit
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+# execution errors can carry whole tracebacks or data dumps
+MAX_ERROR_CHARS = 400
+MAX_FEEDBACK_CHARS = 600
+FIRST_ATTEMPT_FEEDBACK = "No feedback yet. This is the first attempt."
+NO_PREVIOUS_CODE = "None, this is the first attempt."
+# rubric criteria, in the order they are reported
+CRITERIA = [name for name in EvaluationCriteria.model_fields if name not in ("feedback", "error")]
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def summarize_feedback(rubric_list: Optional[list[dict]], include_history: bool = True) -> str:
+    """Failed criteria, feedback and error of the latest attempt, plus one line per distinct earlier error"""
+    if not rubric_list:
+        return FIRST_ATTEMPT_FEEDBACK
+    latest = rubric_list[-1]
+    lines = [f"Attempt {len(rubric_list)} was rejected."]
+    if latest.get("error"):
+        lines.append(f"Execution error: {_clip(latest['error'], MAX_ERROR_CHARS)}")
+    else:
+        failed = [name for name in CRITERIA if not latest.get(name)]
+        if failed:
+            lines.append(f"Failed criteria: {', '.join(failed)}.")
+    if latest.get("feedback"):
+        lines.append(f"Feedback: {_clip(latest['feedback'], MAX_FEEDBACK_CHARS)}")
+    if include_history:
+        # earlier attempts only matter as mistakes not to repeat
+        earlier = []
+        for rubric in rubric_list[:-1]:
+            note = _clip(rubric["error"], 160) if rubric.get("error") else None
+            if note and note not in earlier:
+                earlier.append(note)
+        if earlier:
+            lines.append("Earlier errors to avoid: " + " | ".join(earlier))
+    return "\n".join(lines)
+
+
+def previous_code(chart_code: Optional[str], aggregation_spec: Optional[dict] = None) -> str:
+    """The latest program (and plan-mode spec) the model should revise"""
+    if not chart_code:
+        return NO_PREVIOUS_CODE
+    code = extract_python_code(chart_code) if "<execute_python>" in chart_code else chart_code
+    if aggregation_spec is not None:
+        code = f"# aggregation spec: {json.dumps(aggregation_spec, default=str)}\n{code}"
+    return code
+
+
+def compact_schema(schema: str, user_query: str, detail: bool = True, max_columns: Optional[int] = None) -> str:
+    """Profile table without the value-detail column and/or limited to the most relevant columns"""
+    lines = schema.splitlines()
+    if len(lines) < 2 or " | " not in lines[1]:
+        # not a profile table (e.g. an older free-form schema): nothing to compact
+        return schema
+    head, rows = lines[:2], lines[2:]
+    if not detail:
+        head = [head[0], head[1].rsplit(" | ", 1)[0]]
+        rows = [row.rsplit(" | ", 1)[0] for row in rows]
+    if max_columns is not None and len(rows) > max_columns:
+        # columns named in the query first, then the table order
+        words = set(re.findall(r"\w+", user_query.lower()))
+        mentioned = [row for row in rows if row.split(" | ", 1)[0].lower() in words]
+        rest = [row for row in rows if row not in mentioned]
+        kept = (mentioned + rest)[:max(max_columns, len(mentioned))]
+        rows = [row for row in rows if row in kept] + [f"... {len(rows) - len(kept)} more columns omitted"]
+    return "\n".join(head + rows)
+
+
+def build_generator_inputs(prompt, state: dict, out_path: str,
+                           budget: int = PROMPT_TOKEN_BUDGET) -> tuple[dict, int]:
+    """Prompt inputs for generate_chart_code and the prompt's token count.
+
+    Sends the latest code and a compact summary of what failed instead of every earlier feedback;
+    while the rendered prompt exceeds `budget` tokens it drops, in order: the earlier-error history,
+    the schema's value details, the previous code and finally schema rows beyond 40 columns.
+    """
+    user_query = state.get("user_query")
+    schema = str(state.get("schema"))
+    rubric_list = state.get("rubric")
+    code = previous_code(state.get("chart_code") if rubric_list else None, state.get("aggregation_spec"))
+    charts = [path for path in state.get("chart_path") or [] if path != out_path]
+    if charts:
+        # the revision saves to the new path; the old one in the code would only contradict the prompt
+        code = code.replace(charts[-1], out_path)
+    inputs = {"user_query": user_query,
+              "schema": schema,
+              "feedback": summarize_feedback(rubric_list),
+              "previous_code": code,
+              "out_path_v1": out_path}
+    shrink_steps = [
+        {"feedback": summarize_feedback(rubric_list, include_history=False)},
+        {"schema": compact_schema(schema, user_query, detail=False)},
+        {"previous_code": "Omitted to fit the prompt budget; write the program again."},
+        {"schema": compact_schema(schema, user_query, detail=False, max_columns=40)},
+    ]
+    tokens = count_prompt_tokens(prompt, inputs)
+    for step in shrink_steps:
+        if tokens <= budget:
+            break
+        inputs.update(step)
+        tokens = count_prompt_tokens(prompt, inputs)
+    return inputs, tokens
+
+
+def count_prompt_tokens(prompt, inputs: dict) -> int:
+    return count_text_tokens(prompt.format(**{name: inputs.get(name, "") for name in prompt.input_variables}))
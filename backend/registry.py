@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import warnings
+from typing import Callable, Optional
+from langchain_core.load import load
+from langchain_core.prompts import load_prompt
+from langchain_core.runnables import RunnableSequence
+from backend.llm_cache import CachedChain, LLMCache
+from backend.llm_gateway import LLMGateway
+from backend.metrics import LLMMetricsCallback
+from backend.schema.chart_code_schema import ChartCode
+from backend.schema.aggregation_spec_schema import ChartPlan
+from backend.schema.evaluation_rubric_schema import EvaluationCriteria
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+
+def load_prompt_file(path: str):
+    """Load a saved prompt: PromptTemplate JSON (load_prompt) or a serialized ChatPromptTemplate"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "lc" not in data:
+        return load_prompt(path)
+    with warnings.catch_warnings():
+        # langchain_core.load is flagged as beta
+        warnings.simplefilter("ignore")
+        return load(data)
+
+
+class AgentRegistry:
+    """Process-level cache of the compiled agent, prompt templates and structured-output chains.
+
+    Everything is built once by load() (at startup, or on first use) and shared by every request;
+    call reload() after editing the prompt files or to swap the models.
+    """
+
+    def __init__(self, graph_builder: Callable, generator_llm=None, evaluator_llm=None,
+                 cache: Optional[LLMCache] = None, gateway: Optional[LLMGateway] = None,
+                 llm_factory: Optional[Callable] = None):
+        self.graph_builder = graph_builder
+        self.generator_llm = generator_llm
+        self.evaluator_llm = evaluator_llm
+        # builds whichever model was not passed in, on the first load() rather than at import
+        self.llm_factory = llm_factory
+        self.cache = cache
+        self.gateway = gateway
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        """Build the agent, prompts and chains if they have not been built yet"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._build()
+        return self
+
+    def reload(self, generator_llm=None, evaluator_llm=None):
+        """Rebuild everything, optionally swapping in different models"""
+        with self._lock:
+            if generator_llm is not None:
+                self.generator_llm = generator_llm
+            if evaluator_llm is not None:
+                self.evaluator_llm = evaluator_llm
+            self._build()
+        return self
+
+    def _build(self):
+        if self.generator_llm is None:
+            self.generator_llm = self.llm_factory()
+        if self.evaluator_llm is None:
+            self.evaluator_llm = self.llm_factory()
+        # load saved prompts from disk once
+        self.prompts = {
+            "generator": load_prompt_file(os.path.join(PROMPTS_DIR, "generator_prompt.json")),
+            "evaluator": load_prompt_file(os.path.join(PROMPTS_DIR, "evaluator_prompt.json")),
+            "planner": load_prompt_file(os.path.join(PROMPTS_DIR, "planner_prompt.json")),
+        }
+        # prompt -> model runnables enforcing the output schemas; model calls report latency/tokens
+        # and go through the gateway's rate limits and retries
+        self.generator_chain = RunnableSequence(
+            self.prompts["generator"],
+            self._structured(self.generator_llm, ChartCode),
+        ).with_config(callbacks=[LLMMetricsCallback("generator")])
+        self.evaluator_chain = RunnableSequence(
+            self.prompts["evaluator"],
+            self._structured(self.evaluator_llm, EvaluationCriteria),
+        ).with_config(callbacks=[LLMMetricsCallback("evaluator")])
+        # plan mode: the generator model emits an aggregation spec plus code over its result
+        self.planner_chain = RunnableSequence(
+            self.prompts["planner"],
+            self._structured(self.generator_llm, ChartPlan),
+        ).with_config(callbacks=[LLMMetricsCallback("planner")])
+        # answer repeated calls from the persistent response cache
+        if self.cache is not None:
+            self.generator_chain = CachedChain(self.generator_chain, self.cache, "generator", ChartCode)
+            self.evaluator_chain = CachedChain(self.evaluator_chain, self.cache, "evaluator", EvaluationCriteria)
+            self.planner_chain = CachedChain(self.planner_chain, self.cache, "planner", ChartPlan)
+        # compile the StateGraph last so it is built against the fresh chains
+        self.agent = self.graph_builder()
+        self._loaded = True
+
+    def _structured(self, llm, schema):
+        """llm.with_structured_output(schema), routed through the gateway when there is one"""
+        runnable = llm.with_structured_output(schema)
+        if self.gateway is None:
+            return runnable
+        # provider limits apply per model name, shared by every chain using it
+        return self.gateway.wrap(runnable, getattr(llm, "model_name", None) or llm._llm_type)
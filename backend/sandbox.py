@@ -0,0 +1,424 @@
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from backend.chart_checks import capture_saved_figures, check_saved_figures
+from backend.chart_render import ChartWriteError, render_preview, warm_plotting, write_deferred
+
+logger = logging.getLogger(__name__)
+
+
+def widen_integers(df):
+    """df with every integer column as int64, so arithmetic in generated code cannot silently overflow"""
+    # uint64 keeps its type: values past the int64 range would wrap
+    narrow = [name for name, dtype in df.dtypes.items()
+              if isinstance(dtype, np.dtype) and dtype.kind in "iu" and dtype not in (np.int64, np.uint64)]
+    return df.astype({name: "int64" for name in narrow}) if narrow else df
+
+
+def execute_chart_code(chart_code: str, df, deferred: Optional[list] = None) -> dict:
+    """Run chart code against df, capturing the exception, any warnings raised and local rubric checks.
+
+    On success the last saved figure is also rendered to a small in-memory JPEG ("preview") for the
+    evaluator. With a `deferred` list the full-resolution files are not written here; their paths are
+    reported under "pending_writes" and the caller replays them with write_deferred().
+    """
+    error = None
+    checks = None
+    preview = None
+    preview_seconds = None
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        # uploads load low-cardinality columns as categoricals; pandas' notice about the future
+        # observed= default is not a problem with the chart
+        warnings.filterwarnings("ignore", message=".*observed=False.*", category=FutureWarning)
+        with capture_saved_figures(deferred) as figures:
+            try:
+                exec_globals = {"df": widen_integers(df)}
+                exec(chart_code, exec_globals)
+            except Exception as e:
+                # some exceptions (e.g. MemoryError) carry no message
+                error = str(e) or repr(e)
+            else:
+                # inspect the live Figure before it is garbage collected
+                checks = check_saved_figures(figures)
+        if error is None and figures:
+            try:
+                savefig_kwargs = next((kwargs for fig, _, kwargs in reversed(deferred or []) if fig is figures[-1]), {})
+                start = time.perf_counter()
+                preview = render_preview(figures[-1], savefig_kwargs)
+                preview_seconds = time.perf_counter() - start
+            except Exception:
+                # the evaluator falls back to the saved file
+                preview = None
+    return {"error": error, "warnings": [str(warn.message) for warn in w], "checks": checks,
+            "preview": preview, "preview_seconds": preview_seconds, "pending_writes": [os.fspath(args[0]) for _, args, _ in deferred or []]}
+
+
+# in-process execution (sandbox disabled) writes full-resolution charts off the request path
+_chart_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart-writer")
+# pyplot's global state (current figure, rcParams, font cache) is not thread-safe: concurrent
+# requests and best-of-N candidates run their chart code, and the background writes, one at a time
+_in_process_lock = threading.Lock()
+
+
+def _report_write_error(future):
+    """Background writes have no caller to raise to, so failures are logged"""
+    error = future.exception()
+    if error is not None:
+        logger.error("Deferred chart write failed: %s", error)
+
+
+def _write_deferred_locked(deferred: list) -> list[str]:
+    with _in_process_lock:
+        return write_deferred(deferred)
+
+
+def execute_chart_code_in_process(chart_code: str, df) -> dict:
+    """execute_chart_code() with the full-resolution savefig moved to a background thread"""
+    deferred = []
+    with _in_process_lock:
+        result = execute_chart_code(chart_code, df, deferred)
+    if deferred:
+        _chart_writer.submit(_write_deferred_locked, deferred).add_done_callback(_report_write_error)
+    return result
+
+
+#------------------------------------------Worker process side-------------------------------#
+def _set_memory_limit(memory_limit_mb: Optional[int]):
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        # not supported on this platform; the wall-clock limit still applies
+        pass
+
+
+def _load_frame(path: str, fmt: str):
+    """Read a dataset published by the parent into a pandas frame (a full copy; the file is only memory-mapped while converting)"""
+    import pandas as pd
+    if fmt == "arrow":
+        import pyarrow as pa
+        with pa.memory_map(path, "r") as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    return pd.read_pickle(path)
+
+
+def _worker_main(conn, memory_limit_mb: Optional[int], cache_size: int):
+    """Long-lived worker: import the plotting stack once, then execute jobs until told to stop"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn  # noqa: F401  imported once so generated code gets it for free
+    pd.set_option("mode.copy_on_write", True)
+    try:
+        # the first job should not pay for fonts, text layout and the image encoders
+        warm_plotting()
+    except Exception:
+        pass
+
+    _set_memory_limit(memory_limit_mb)
+    frames = OrderedDict()
+    # tell the pool the imports are done; only warm workers receive jobs
+    conn.send("ready")
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        deferred = []
+        try:
+            df = frames.get(job["dataset_id"])
+            if df is None:
+                df = _load_frame(job["path"], job["format"])
+                frames[job["dataset_id"]] = df
+                while len(frames) > cache_size:
+                    frames.popitem(last=False)
+            else:
+                frames.move_to_end(job["dataset_id"])
+            result = execute_chart_code(job["code"], df.copy(deep=False), deferred)
+        except MemoryError:
+            result = {"error": "Chart code exceeded the sandbox memory limit.", "warnings": [], "checks": None}
+        except Exception as e:
+            result = {"error": str(e), "warnings": [], "checks": None}
+        finally:
+            # never leak figures between jobs (closed figures can still be saved below)
+            plt.close("all")
+        conn.send(result)
+        # the caller already has the checks and the evaluator preview; the full-resolution
+        # PNG is encoded after replying, then acknowledged so the pool can reuse this worker
+        if result.get("pending_writes"):
+            try:
+                write_deferred(deferred)
+                conn.send("written")
+            except (ChartWriteError, MemoryError) as e:
+                conn.send(f"Deferred chart write failed: {e or 'out of memory'}")
+        deferred.clear()
+
+
+#------------------------------------------API process side-------------------------------#
+class _Worker:
+    """Handle on one pre-forked sandbox process"""
+
+    def __init__(self, ctx, memory_limit_mb, cache_size):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_limit_mb, cache_size), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ChartSandbox:
+    """Pool of warm worker processes that execute LLM-generated chart code in isolation.
+
+    Workers import pandas, matplotlib (Agg) and seaborn once. Datasets are written once per
+    dataset_id as Arrow IPC files (in /dev/shm when there is room); each worker converts a file
+    to pandas on first use and caches the frame, so every worker holds its own copy of the
+    datasets it has served (at most max_datasets). Every job runs under a
+    wall-clock timeout and an address-space limit; a worker that times out or dies is replaced.
+    """
+
+    STARTUP_TIMEOUT = 120
+    # consecutive workers that may fail to start before the pool stops respawning them
+    MAX_STARTUP_FAILURES = 3
+
+    def __init__(self, workers: int = 2, timeout: float = 60, memory_limit_mb: Optional[int] = 4096,
+                 max_datasets: int = 8, queue_timeout: float = 120):
+        self.workers = workers
+        self.timeout = timeout
+        # longest a job waits for a free worker before failing with an execution error
+        self.queue_timeout = queue_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_datasets = max_datasets
+        self._ctx = mp.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: list[_Worker] = []
+        self._published: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._data_dir = None
+        self._disk_dir = None
+        self._started = False
+        # workers that finished their imports and warm-up chart
+        self._ready = threading.Condition()
+        self._ready_count = 0
+        self._startup_failures = 0
+
+    def start(self):
+        """Pre-fork the worker processes (idempotent)"""
+        with self._lock:
+            if self._started:
+                return self
+            shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            self._data_dir = tempfile.mkdtemp(prefix="chart-sandbox-", dir=shm)
+            # fallback for datasets that do not fit in /dev/shm
+            self._disk_dir = tempfile.mkdtemp(prefix="chart-sandbox-") if shm else self._data_dir
+            for _ in range(self.workers):
+                self._add_worker()
+            self._started = True
+        atexit.register(self.shutdown)
+        return self
+
+    def shutdown(self):
+        """Stop all workers and remove published datasets"""
+        with self._lock:
+            if not self._started:
+                return
+            for worker in self._all:
+                worker.stop()
+            self._all.clear()
+            self._idle = queue.Queue()
+            self._published.clear()
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+            shutil.rmtree(self._disk_dir, ignore_errors=True)
+            self._started = False
+        with self._ready:
+            self._ready_count = 0
+        self._startup_failures = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Block until every initial worker is warm (or timeout seconds pass); False on timeout"""
+        with self._ready:
+            return self._ready.wait_for(lambda: self._ready_count >= self.workers, timeout)
+
+    def run(self, chart_code: str, df, dataset_id: str, timeout: Optional[float] = None) -> dict:
+        """Execute chart code in a worker; returns execute_chart_code()'s result (errors as messages)"""
+        self.start()
+        try:
+            path, fmt = self._publish(dataset_id, df)
+        except OSError as e:
+            return {"error": f"Could not hand the dataset to the chart sandbox: {e}", "warnings": [], "checks": None}
+        timeout = timeout or self.timeout
+        worker = self._acquire()
+        if worker is None:
+            return {"error": "No chart sandbox worker is available (workers failed to start or all stayed busy).",
+                    "warnings": [], "checks": None}
+        try:
+            worker.conn.send({"code": chart_code, "dataset_id": dataset_id, "path": path, "format": fmt})
+            if not worker.conn.poll(timeout):
+                self._replace(worker)
+                worker = None
+                return {"error": f"Chart code timed out after {timeout:g} seconds.", "warnings": [], "checks": None}
+            result = worker.conn.recv()
+            if result.get("pending_writes"):
+                # back to the idle pool only once its background writes are done
+                threading.Thread(target=self._await_written, args=(worker, timeout), daemon=True).start()
+                worker = None
+            return result
+        except (EOFError, BrokenPipeError, OSError):
+            # the worker died mid-job (crash, OOM kill, os._exit in generated code ...)
+            self._replace(worker)
+            worker = None
+            return {"error": "Chart code crashed the sandbox worker.", "warnings": [], "checks": None}
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def _acquire(self) -> Optional[_Worker]:
+        """An idle worker, or None after queue_timeout or once no worker is running or starting"""
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                return self._idle.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                with self._lock:
+                    if not self._all:
+                        return None
+
+    def _add_worker(self):
+        worker = _Worker(self._ctx, self.memory_limit_mb, self.max_datasets)
+        self._all.append(worker)
+        threading.Thread(target=self._await_ready, args=(worker,), daemon=True).start()
+
+    def _await_ready(self, worker: _Worker):
+        """Hand a freshly forked worker to the idle queue once its imports have finished"""
+        try:
+            if worker.conn.poll(self.STARTUP_TIMEOUT) and worker.conn.recv() == "ready":
+                with self._lock:
+                    self._startup_failures = 0
+                self._idle.put(worker)
+                with self._ready:
+                    self._ready_count += 1
+                    self._ready.notify_all()
+                return
+        except (EOFError, OSError):
+            pass
+        worker.kill()
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+            # replace it, unless workers keep dying on start-up (e.g. a broken import)
+            self._startup_failures += 1
+            if self._started and self._startup_failures < self.MAX_STARTUP_FAILURES:
+                self._add_worker()
+
+    def _await_written(self, worker: _Worker, timeout: float):
+        try:
+            if worker.conn.poll(timeout):
+                reply = worker.conn.recv()
+                if reply != "written":
+                    # the worker itself is fine; the lost file must not go unnoticed
+                    logger.error("%s", reply)
+                self._idle.put(worker)
+                return
+        except (EOFError, OSError):
+            pass
+        self._replace(worker)
+
+    def _replace(self, worker: _Worker):
+        worker.kill()
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+            if self._started:
+                self._add_worker()
+
+    def _publish(self, dataset_id: str, df) -> tuple[str, str]:
+        """Write df once per dataset_id to a file the workers can read; raises OSError if no directory has room"""
+        with self._lock:
+            if dataset_id in self._published:
+                self._published.move_to_end(dataset_id)
+                return self._published[dataset_id]
+            error = None
+            # /dev/shm first (Docker gives containers only 64 MB of it unless shm_size is set), then disk
+            for directory in (self._data_dir, self._disk_dir):
+                path = os.path.join(directory, dataset_id)
+                try:
+                    entry = (path, _write_frame(df, path))
+                    break
+                except OSError as e:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    error = e
+            else:
+                raise error
+            self._published[dataset_id] = entry
+            while len(self._published) > self.max_datasets:
+                old_path, _ = self._published.popitem(last=False)[1]
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+            return entry
+
+
+def _write_frame(df, path: str) -> str:
+    """Write df as an Arrow IPC file, or a pickle for frames Arrow cannot represent; returns the format"""
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except Exception:
+        # mixed-type object columns etc.
+        df.to_pickle(path)
+        return "pickle"
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return "arrow"
+
+
+def sandbox_from_env() -> Optional[ChartSandbox]:
+    """Build the chart sandbox from CHART_SANDBOX* env vars; None when CHART_SANDBOX=0"""
+    if os.getenv("CHART_SANDBOX", "1") == "0":
+        return None
+    memory_limit_mb = int(os.getenv("CHART_SANDBOX_MEMORY_MB", "4096"))
+    return ChartSandbox(
+        workers=int(os.getenv("CHART_SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        timeout=float(os.getenv("CHART_SANDBOX_TIMEOUT", "60")),
+        memory_limit_mb=memory_limit_mb or None,
+        queue_timeout=float(os.getenv("CHART_SANDBOX_QUEUE_TIMEOUT", "120")),
+    )
+
+
+# process-wide pool; workers are forked on first use or at API startup
+chart_sandbox = sandbox_from_env()
@@ -0,0 +1,38 @@
+from pydantic import BaseModel,Field
+from typing import Literal,Optional,Union
+
+#Schemas for plan-then-plot: the generator declares how to reduce the data, the backend executes it.
+class Filter(BaseModel):
+    """Row filter applied before grouping"""
+    column: str = Field(...,description="Column to filter on")
+    op: Literal["==","!=",">",">=","<","<=","in","not in","is null","not null"] = Field(...,description="Comparison operator")
+    value: Optional[Union[float,int,str,bool,list[Union[float,int,str,bool]]]] = Field(None,description="Comparison value; a list for 'in'/'not in', omitted for null checks")
+
+class Bin(BaseModel):
+    """Bucket a numeric or datetime column into a new grouping column"""
+    column: str = Field(...,description="Numeric or datetime column to bin")
+    bins: Optional[int] = Field(None,description="Number of equal-width bins for numeric columns")
+    freq: Optional[Literal["D","W","M","Q","Y"]] = Field(None,description="Period for datetime columns (day, week, month, quarter, year)")
+    alias: Optional[str] = Field(None,description="Name of the binned column; defaults to '<column>_bin'")
+
+class Measure(BaseModel):
+    """Aggregate computed per group"""
+    column: Optional[str] = Field(None,description="Column to aggregate; omit for a row count")
+    agg: Literal["count","sum","mean","median","min","max","nunique","std"] = Field(...,description="Aggregation function")
+    alias: Optional[str] = Field(None,description="Name of the result column; defaults to '<agg>_<column>'")
+
+class AggregationSpec(BaseModel):
+    """Declarative reduction of the dataset executed by the backend before plotting"""
+    filters: list[Filter] = Field(default_factory=list,description="Row filters, combined with AND")
+    bins: list[Bin] = Field(default_factory=list,description="Binned columns usable in group_by by their alias")
+    group_by: list[str] = Field(default_factory=list,description="Grouping columns or bin aliases")
+    measures: list[Measure] = Field(default_factory=list,description="Aggregates per group; leave empty to plot a row sample instead")
+    sort_by: Optional[str] = Field(None,description="Result column to sort by, descending")
+    limit: Optional[int] = Field(None,description="Keep only the first N groups after sorting")
+    sample_size: Optional[int] = Field(None,description="Rows to sample when no measures are given (e.g. scatter plots)")
+
+#Schema for generator llm in plan mode: aggregation spec + plotting code over its result.
+class ChartPlan(BaseModel):
+    """Aggregation spec and the chart code that plots its (small) result"""
+    spec: AggregationSpec = Field(...,description="How to reduce the full dataset before plotting")
+    code: str = Field(...,description="Valid Python code inside <execute_python>...</execute_python> tags that plots the aggregated DataFrame 'df'")
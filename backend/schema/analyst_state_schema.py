@@ -3,9 +3,18 @@ from typing import TypedDict,Optional,Annotated
 # create analyst state schema
 class AnalystState(TypedDict):
     user_query : str
-    data: dict
-    schema: dict
+    dataset_id: str
+    schema: str
     max_retry: int 
     rubric : Optional[list[dict[str,any]]]
     chart_code: Optional[str]
-    chart_path: Optional[list[str]]
\ No newline at end of file
+    chart_path: Optional[list[str]]
+    run_id: Optional[str]
+    local_checks: Optional[dict]
+    chart_image: Optional[str]
+    num_candidates: Optional[int]
+    candidates: Optional[list[dict]]
+    plan_mode: Optional[bool]
+    aggregation_spec: Optional[dict]
+    code_repairs: Optional[list[str]]
+    prompt_tokens: Optional[list[int]]
@@ -0,0 +1,76 @@
+import base64
+import math
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Optional
+
+# tokenizer of the gpt-4o family used by the generator and evaluator
+ENCODING_NAME = "o200k_base"
+# OpenAI vision pricing: a fixed base per image plus a fixed cost per 512px tile at high detail
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken encoding, or None when tiktoken or its BPE file is unavailable (offline)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        return None
+
+
+def count_text_tokens(text: str) -> int:
+    """Tokens in a string; ~4 characters per token when no tokenizer is available"""
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def image_tokens(width: int, height: int, detail: str = "auto") -> int:
+    """Prompt tokens the vision model bills for one image at the given detail level"""
+    if detail == "low":
+        return IMAGE_BASE_TOKENS
+    # high (and auto, conservatively): fit into 2048x2048, shortest side down to 768, 512px tiles
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def data_url_size(url: str) -> Optional[tuple[int, int]]:
+    """Pixel size of a base64 data URL image, None for remote URLs or undecodable data"""
+    if not url.startswith("data:") or "," not in url:
+        return None
+    try:
+        from PIL import Image
+        return Image.open(BytesIO(base64.b64decode(url.split(",", 1)[1]))).size
+    except Exception:
+        return None
+
+
+def count_content_tokens(content: Any) -> int:
+    """Tokens of a message content: plain text or a list of text/image_url parts"""
+    if isinstance(content, str):
+        return count_text_tokens(content)
+    total = 0
+    for part in content or []:
+        if isinstance(part, str):
+            total += count_text_tokens(part)
+        elif part.get("type") == "text":
+            total += count_text_tokens(part.get("text", ""))
+        elif part.get("type") == "image_url":
+            image = part.get("image_url") or {}
+            image = {"url": image} if isinstance(image, str) else image
+            size = data_url_size(image.get("url", ""))
+            total += image_tokens(*size, image.get("detail", "auto")) if size else IMAGE_BASE_TOKENS
+    return total
+
+
+def count_message_tokens(messages: list) -> int:
+    """Approximate prompt tokens of a list of chat messages"""
+    # a few tokens of per-message framing, as in OpenAI's chat format
+    return sum(count_content_tokens(message.content) + 3 for message in messages) + 3
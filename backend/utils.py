@@ -1,18 +1,32 @@
-import pandas as pd
 import base64
 from PIL import Image
 from io import BytesIO
 from backend.schema.analyst_state_schema import AnalystState
 from backend.schema.evaluation_rubric_schema import EvaluationCriteria
+from backend.dataset_store import dataset_store
+from backend.profiler import profile_cache,summarize_profile
+from backend.ingest import read_csv_compact
 import re
+import json
 import os
+import shutil
 
 def load_csv_data(file_path):
-    """load csv into pandas Dataframe and return df with schema"""
-    df = pd.read_csv(file_path)
-    schema = df.dtypes.to_dict()
+    """load csv into pandas Dataframe, register it in the dataset store and return df with its profiled schema"""
+    # streamed pyarrow parse with categoricals instead of pandas' object defaults
+    df = read_csv_compact(file_path)
+    dataset_id = dataset_store.put(df)
+    # column statistics are cached by content hash, so a re-upload never re-profiles
+    profile = profile_cache.get_profile(df,dataset_id)
+    schema = summarize_profile(profile)
     return df,schema
 
+def load_dataset(dataset_id:str):
+    """Resolve a stored dataset_id to its DataFrame and profiled schema; raises DatasetNotFoundError"""
+    df = dataset_store.get(dataset_id)
+    profile = profile_cache.get_profile(df,dataset_id)
+    return df,summarize_profile(profile)
+
 def extract_python_code(code_string:str) -> str:
     match = re.search(r"<execute_python>([\s\S]*?)</execute_python>", code_string)
     if match:
@@ -56,7 +70,14 @@ def clear_charts():
             file_path = os.path.join(dir_path,file)
             if os.path.isfile(file_path):
                 os.remove(file_path)
+            elif os.path.isdir(file_path):
+                # per-run chart namespace
+                shutil.rmtree(file_path,ignore_errors=True)
         return {"status_code":200,"message":"All charts deleted successfully."}
     else:
         return {"status_code":404,"message":"Path does not exist"}
     
+
+def format_sse(event:dict) -> str:
+    """Serialize an event dict as one Server-Sent Events message"""
+    return f"event: {event['event']}\ndata: {json.dumps(event,default=str)}\n\n"
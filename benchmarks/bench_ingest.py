@@ -0,0 +1,108 @@
+"""CSV ingestion: peak memory and parse time of the old in-memory pandas path vs the streamed pyarrow path.
+
+Generates a synthetic CSV (ints, floats, low-cardinality strings, free text) of --rows rows and
+parses it in a fresh subprocess per method, so each peak RSS is measured from a clean interpreter:
+  bytes_pandas   read the whole upload into bytes, pd.read_csv(io.BytesIO(...)) (previous behaviour)
+  compact        backend.ingest.read_csv_compact on the spooled file
+
+Run from the project root:
+    python -m benchmarks.bench_ingest --rows 2000000
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_workflow import git_revision
+
+METHODS = ("bytes_pandas", "compact")
+
+
+def write_csv(path: str, rows: int, seed: int = 0):
+    """Synthetic sales-like table written in chunks so generating it stays small"""
+    rng = np.random.default_rng(seed)
+    regions = np.array(["North", "South", "East", "West", "Central"])
+    products = np.array([f"product_{i:03d}" for i in range(300)])
+    chunk = 500_000
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        frame = pd.DataFrame({
+            "order_id": np.arange(start, start + n),
+            "quantity": rng.integers(1, 50, n),
+            "price": rng.gamma(2.0, 20.0, n).round(2),
+            "region": regions[rng.integers(0, len(regions), n)],
+            "product": products[rng.integers(0, len(products), n)],
+            "customer": [f"customer {i}" for i in rng.integers(0, 10 ** 6, n)],
+        })
+        frame.to_csv(path, mode="a" if start else "w", header=start == 0, index=False)
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux only; None elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+    except OSError:
+        return None
+
+
+def measure(method: str, path: str) -> dict:
+    """Parse `path` with `method` in this process; peak RSS is the process high-water mark"""
+    start = time.perf_counter()
+    if method == "bytes_pandas":
+        with open(path, "rb") as f:
+            contents = f.read()
+        df = pd.read_csv(io.BytesIO(contents))
+    else:
+        from backend.ingest import read_csv_compact
+        df = read_csv_compact(path)
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "rss_after_mb": current_rss_mb(),
+            "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+            "dtypes": {str(name): str(dtype) for name, dtype in df.dtypes.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--output", default="benchmarks/results/bench_ingest.json")
+    parser.add_argument("--measure", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.csv")
+        write_csv(path, args.rows)
+        size_mb = os.path.getsize(path) / 1024 ** 2
+        report = {"benchmark": "bench_ingest", "revision": git_revision(),
+                  "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+                  "settings": {"rows": args.rows, "csv_mb": round(size_mb, 1)}, "methods": {}}
+        print(f"{args.rows} rows, {size_mb:.1f} MB CSV")
+        for method in METHODS:
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_ingest", "--measure", method, path],
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            report["methods"][method] = result
+            print(f"{method:>13}: {result['seconds']:.2f}s  peak RSS {result['peak_rss_mb']:.0f} MB  "
+                  f"RSS after {result['rss_after_mb']} MB  frame {result['frame_mb']:.0f} MB")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
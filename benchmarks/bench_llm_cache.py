@@ -0,0 +1,69 @@
+"""Offline check of the LLM response cache: run the same query twice against scripted models.
+
+Run from the project root:
+    python -m benchmarks.bench_llm_cache --latency 1.0
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from backend.agent_backend import registry, run_workflow
+from backend.fake_llm import ScriptedChatModel
+from backend.llm_cache import LLMCache
+from backend.utils import load_csv_data
+from backend.dataset_store import dataset_store
+
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+import seaborn as sns
+sns.barplot(data=df, x="Pclass", y="Survived", hue="Sex", errorbar=None)
+plt.title("Survival rate by class and gender")
+plt.xlabel("Passenger class")
+plt.ylabel("Survival rate")
+plt.savefig("{out_path}", dpi=300)
+plt.close()
+</execute_python>"""
+
+
+def chart_code_response(messages) -> dict:
+    """Scripted generator answer that saves to the output path requested in the prompt"""
+    out_path = re.search(r"Save the figure as '([^']+)'", str(messages[-1].content)).group(1)
+    return {"code": CHART_CODE.replace("{out_path}", out_path)}
+
+
+RUBRIC = {"relevance": 1, "has_clear_title": 1, "has_axis_labels": 1, "has_legend_if_needed": 1,
+          "correct_data_mapping": 1, "appropriate_chart_type": 1, "has_clarity": 1,
+          "feedback": "Clear chart that answers the query.", "error": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=1.0, help="simulated seconds per model call")
+    parser.add_argument("--data", default="data/titanic.csv")
+    args = parser.parse_args()
+
+    generator = ScriptedChatModel(responses=[chart_code_response], latency=args.latency)
+    evaluator = ScriptedChatModel(responses=[RUBRIC], latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        registry.cache = LLMCache(os.path.join(tmp, "llm_cache.sqlite"))
+        registry.reload(generator_llm=generator, evaluator_llm=evaluator)
+
+        os.makedirs("charts", exist_ok=True)
+        df, schema = load_csv_data(args.data)
+        for attempt in ("cold", "warm"):
+            state = {"user_query": "Plot the relationship between gender, class and survival rate.",
+                     "dataset_id": dataset_store.put(df), "schema": schema, "max_retry": 3,
+                     "rubric": None, "chart_code": None, "chart_path": None}
+            start = time.perf_counter()
+            run_workflow(state)
+            print(f"{attempt}: {time.perf_counter() - start:7.3f} s  "
+                  f"model calls so far: generator={generator.calls} evaluator={evaluator.calls}")
+        print("cache stats:", registry.cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Rate-limited model calls with and without the LLM gateway, against the local 429 stub server.
+
+Fires a burst of concurrent evaluator-style structured calls at a stub that only admits --rpm
+requests per minute and compares: no retries, the OpenAI SDK's own retries, and the gateway
+(pacing at the stub's limit plus jittered backoff).
+
+Run from the project root:
+    python -m benchmarks.bench_llm_gateway --calls 40 --threads 16 --rpm 120
+"""
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_openai import ChatOpenAI
+from backend.llm_gateway import LLMGateway, shared_http_client
+from backend.schema.evaluation_rubric_schema import EvaluationCriteria
+from benchmarks.bench_workflow import git_revision, summarize
+from benchmarks.stub_llm_server import start_stub_server
+
+PROMPT = "Evaluate this chart of survival rate by passenger class."
+
+
+def run_burst(model, calls: int, threads: int) -> dict:
+    """Invoke `model` `calls` times from `threads` threads; latency of successes and error types"""
+    latencies, errors = [], {}
+    lock = threading.Lock()
+    remaining = iter(range(calls))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                model.invoke(PROMPT)
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return {"succeeded": len(latencies), "failed": errors, "wall_seconds": round(time.perf_counter() - start, 3),
+            "latency_seconds": summarize(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rpm", type=float, default=120, help="stub server requests per minute")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds per completion")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="fraction of stub calls failing with 500")
+    parser.add_argument("--output", default="benchmarks/results/bench_llm_gateway.json")
+    args = parser.parse_args()
+
+    def client(max_retries: int) -> ChatOpenAI:
+        return ChatOpenAI(model="gpt-4o", base_url=base_url, max_retries=max_retries, http_client=shared_http_client())
+
+    report = {"benchmark": "bench_llm_gateway", "revision": git_revision(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+              "settings": vars(args), "scenarios": {}}
+    scenarios = {
+        "no_retries": lambda: client(0).with_structured_output(EvaluationCriteria),
+        "sdk_retries": lambda: client(2).with_structured_output(EvaluationCriteria),
+        "gateway": lambda: LLMGateway(concurrency=8, rpm=args.rpm, tpm=1_000_000, deadline_seconds=300,
+                                     burst_seconds=1.0).wrap(
+            client(0).with_structured_output(EvaluationCriteria), "gpt-4o"),
+    }
+    for name, build in scenarios.items():
+        # a fresh stub per scenario so every run starts with a full rate-limit window
+        server, state = start_stub_server(0, args.rpm, args.latency, args.error_rate)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        result = run_burst(build(), args.calls, args.threads)
+        server.shutdown()
+        result["stub_responses"] = dict(state.counts)
+        report["scenarios"][name] = result
+        print(f"{name:>12}: {result['succeeded']}/{args.calls} ok  failed={result['failed']}  "
+              f"wall={result['wall_seconds']}s  p95={result['latency_seconds'].get('p95')}s  "
+              f"stub 429s={state.counts['rate_limited']}")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
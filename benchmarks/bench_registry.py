@@ -0,0 +1,62 @@
+"""Micro-benchmark: per-request setup cost with and without the process-level AgentRegistry.
+
+Run from the project root:
+    python -m benchmarks.bench_registry --iterations 50
+"""
+import argparse
+import os
+import time
+
+# ChatOpenAI only needs a key to be constructed; no request is ever sent here
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.runnables import RunnableSequence
+from backend.agent_backend import create_agent, default_llm, registry
+from backend.registry import PROMPTS_DIR, load_prompt_file
+from backend.schema.chart_code_schema import ChartCode
+from backend.schema.evaluation_rubric_schema import EvaluationCriteria
+
+# the models existed before and after the registry; only the per-request work differs
+generator_llm, evaluator_llm = default_llm(), default_llm()
+
+
+def per_request_setup():
+    """What every request used to pay: compile the graph, re-read prompts, rebuild chains"""
+    create_agent()
+    generator = generator_llm.with_structured_output(ChartCode)
+    evaluator = evaluator_llm.with_structured_output(EvaluationCriteria)
+    RunnableSequence(load_prompt_file(os.path.join(PROMPTS_DIR, "generator_prompt.json")), generator)
+    RunnableSequence(load_prompt_file(os.path.join(PROMPTS_DIR, "evaluator_prompt.json")), evaluator)
+
+
+def registry_lookup():
+    """What every request pays now: attribute lookups on the warm registry"""
+    registry.agent
+    registry.generator_chain
+    registry.evaluator_chain
+
+
+def timeit(fn, iterations: int) -> float:
+    """Mean wall-clock milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    registry.load()
+    rebuild_ms = timeit(per_request_setup, args.iterations)
+    cached_ms = timeit(registry_lookup, args.iterations)
+
+    print(f"per-request rebuild : {rebuild_ms:9.3f} ms")
+    print(f"registry lookup     : {cached_ms:9.3f} ms")
+    print(f"saved per request   : {rebuild_ms - cached_ms:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
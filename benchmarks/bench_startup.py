@@ -0,0 +1,121 @@
+"""Cold start: API import and startup time, then the latency of the first and second chart and token count.
+
+Each scenario runs in a fresh interpreter (like a new container replica):
+  import_seconds        import backend.main
+  startup_seconds       FastAPI lifespan (what runs before the first request is accepted)
+  first_chart_seconds   first chart execution after startup (sandbox worker or in-process)
+  second_chart_seconds  the same chart again, fully warm
+  first_tokens_seconds  first prompt token count (tokenizer load)
+Scenarios: sandbox workers vs in-process execution, each with matplotlib's font cache present
+("warm_cache") and with an empty MPLCONFIGDIR ("cold_cache"), as on a fresh container.
+
+Run from the project root:
+    python -m benchmarks.bench_startup --repeats 3
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.bench_workflow import git_revision, summarize
+
+CHART_CODE = """
+import matplotlib.pyplot as plt
+import seaborn as sns
+rates = df.groupby("Pclass", observed=True)["Survived"].mean().reset_index()
+fig, ax = plt.subplots(figsize=(8, 5))
+sns.barplot(data=rates, x="Pclass", y="Survived", ax=ax)
+ax.set_title("Survival rate by passenger class")
+ax.set_xlabel("Passenger class")
+ax.set_ylabel("Survival rate")
+plt.savefig({out_path!r}, dpi=100)
+plt.close()
+"""
+
+
+def measure(out_dir: str) -> dict:
+    """One cold start in this (fresh) process"""
+    timings = {}
+    start = time.perf_counter()
+    import backend.main as api
+    timings["import_seconds"] = time.perf_counter() - start
+
+    from fastapi.testclient import TestClient
+    start = time.perf_counter()
+    client = TestClient(api.app)
+    client.__enter__()
+    timings["startup_seconds"] = time.perf_counter() - start
+
+    from backend.sandbox import chart_sandbox, execute_chart_code_in_process
+    from backend.tokens import count_text_tokens
+    from backend.utils import load_csv_data
+    df, schema = load_csv_data(os.path.join("data", "titanic.csv"))
+    for label in ("first_chart_seconds", "second_chart_seconds"):
+        code = CHART_CODE.format(out_path=os.path.join(out_dir, f"{label}.png"))
+        start = time.perf_counter()
+        if chart_sandbox is not None:
+            result = chart_sandbox.run(code, df, "bench-startup")
+        else:
+            result = execute_chart_code_in_process(code, df)
+        timings[label] = time.perf_counter() - start
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+    start = time.perf_counter()
+    count_text_tokens(schema)
+    timings["first_tokens_seconds"] = time.perf_counter() - start
+    client.__exit__(None, None, None)
+    return {name: round(value, 3) for name, value in timings.items()}
+
+
+def run_scenario(sandbox: bool, cold_cache: bool) -> dict:
+    """measure() in a fresh interpreter; wall_seconds also counts interpreter start-up"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CHART_SANDBOX": "1" if sandbox else "0"}
+        env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        if cold_cache:
+            env["MPLCONFIGDIR"] = os.path.join(tmp, "mplconfig")
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--measure", tmp],
+                             capture_output=True, text=True, env=env)
+        wall = time.perf_counter() - start
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr[-2000:])
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = round(wall, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="benchmarks/results/bench_startup.json")
+    parser.add_argument("--measure", metavar="OUT_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    report = {"benchmark": "bench_startup", "revision": git_revision(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+              "cpus": os.cpu_count(), "settings": vars(args), "scenarios": {}}
+    for sandbox in (True, False):
+        for cold_cache in (False, True):
+            name = f"{'sandbox' if sandbox else 'in_process'}_{'cold' if cold_cache else 'warm'}_cache"
+            runs = [run_scenario(sandbox, cold_cache) for _ in range(args.repeats)]
+            summary = {metric: summarize([run[metric] for run in runs]) for metric in runs[0]}
+            report["scenarios"][name] = summary
+            print(f"{name:>22}: " + "  ".join(f"{metric.replace('_seconds', '')}={summary[metric]['p50']:.2f}s"
+                                              for metric in runs[0]))
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
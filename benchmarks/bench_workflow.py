@@ -0,0 +1,417 @@
+"""Offline end-to-end benchmark of run_workflow and the FastAPI app with scripted LLMs.
+
+Every workflow replays a realistic retry sequence: a first program that crashes in a way
+the local code repair cannot fix (pivot over duplicate entries), a second one that renders
+but misses its title (rejected by the evaluator) and a third one that passes. Datasets are resampled from data/titanic.csv to the requested sizes;
+each size is measured in a fresh process so peak RSS is not inherited from bigger runs.
+
+Run from the project root:
+    python -m benchmarks.bench_workflow --sizes 1000,100000,1000000 --runs 3
+    python -m benchmarks.bench_workflow --sizes 5000000 --runs 1 --rps-requests 0
+Results are written as JSON (see --output) for regression tracking.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# measure real generator/evaluator work, not cache hits
+os.environ["LLM_CACHE"] = "0"
+
+NODES = ("generate_chart_code", "generate_chart", "evaluate_chart")
+QUERY = "Plot the relationship between gender, class and survival rate."
+
+PROGRAM_HEAD = """<execute_python>
+import matplotlib.pyplot as plt
+import seaborn as sns
+"""
+
+# attempt 1: pivot without aggregation over repeated (class, sex) pairs -> execution error that
+# repair_chart_code leaves alone, so it costs a full generator round trip
+BROKEN_CODE = PROGRAM_HEAD + """rates = df.pivot(index="Pclass", columns="Sex", values="Survived")
+rates.plot(kind="bar")
+plt.savefig("{out_path}", dpi=300)
+plt.close()
+</execute_python>"""
+
+# attempt 2: renders, but without a title -> rejected by the evaluator
+UNTITLED_CODE = PROGRAM_HEAD + """sns.barplot(data=df, x="Pclass", y="Survived", hue="Sex", errorbar=None)
+plt.xlabel("Passenger class")
+plt.ylabel("Survival rate")
+plt.savefig("{out_path}", dpi=300)
+plt.close()
+</execute_python>"""
+
+# attempt 3 onwards: complete chart
+GOOD_CODE = PROGRAM_HEAD + """sns.barplot(data=df, x="Pclass", y="Survived", hue="Sex", errorbar=None)
+plt.title("Survival rate by class and gender")
+plt.xlabel("Passenger class")
+plt.ylabel("Survival rate")
+plt.savefig("{out_path}", dpi=300)
+plt.close()
+</execute_python>"""
+
+PASSING_RUBRIC = {"relevance": 1, "has_clear_title": 1, "has_axis_labels": 1, "has_legend_if_needed": 1,
+                  "correct_data_mapping": 1, "appropriate_chart_type": 1, "has_clarity": 1,
+                  "feedback": "Clear chart that answers the query.", "error": None}
+FAILING_RUBRIC = {**PASSING_RUBRIC, "has_clear_title": 0, "has_clarity": 0,
+                  "feedback": "Add a descriptive title so the chart can be read on its own."}
+
+
+def scripted_generator(messages) -> dict:
+    """Pick the program by attempt number (chart_v{n}) so concurrent runs stay deterministic"""
+    prompt = str(messages[-1].content)
+    out_path = re.search(r"Save the figure as '([^']+)'", prompt).group(1)
+    attempt = int(re.search(r"chart_v(\d+)", out_path).group(1))
+    code = (BROKEN_CODE, UNTITLED_CODE, GOOD_CODE)[min(attempt, 2)]
+    return {"code": code.replace("{out_path}", out_path)}
+
+
+# evaluator prompt sizes seen during the run: the image as a vision part vs inlined base64 text
+EVALUATOR_PROMPT_TOKENS = {"multimodal": [], "base64_text": [], "image_low": [], "image_high": []}
+
+
+def record_evaluator_tokens(messages):
+    from backend.tokens import count_message_tokens, count_text_tokens, image_tokens, data_url_size
+
+    EVALUATOR_PROMPT_TOKENS["multimodal"].append(count_message_tokens(messages))
+    # what the old text-only PromptTemplate sent: every part flattened into the prompt string
+    flattened = []
+    for message in messages:
+        parts = message.content if isinstance(message.content, list) else [message.content]
+        for part in parts:
+            if isinstance(part, str):
+                flattened.append(part)
+            elif part.get("type") == "text":
+                flattened.append(part["text"])
+            elif part.get("type") == "image_url":
+                url = part["image_url"]["url"]
+                flattened.append(url.split(",", 1)[-1])
+                size = data_url_size(url)
+                if size:
+                    EVALUATOR_PROMPT_TOKENS["image_low"].append(image_tokens(*size, "low"))
+                    EVALUATOR_PROMPT_TOKENS["image_high"].append(image_tokens(*size, "high"))
+    EVALUATOR_PROMPT_TOKENS["base64_text"].append(count_text_tokens("\n".join(flattened)))
+
+
+def scripted_evaluator(messages) -> dict:
+    """Reject charts whose code sets no title, accept the rest"""
+    record_evaluator_tokens(messages)
+    prompt = " ".join(str(message.content) for message in messages)
+    return PASSING_RUBRIC if "plt.title(" in prompt else FAILING_RUBRIC
+
+
+def make_dataset(source: str, rows: int, out_path: str, seed: int = 0):
+    """Resample the source CSV to `rows` rows with a little numeric jitter"""
+    import numpy as np
+    import pandas as pd
+
+    base = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    chunk = 500_000
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        part = base.sample(n=n, replace=True, random_state=seed + start).reset_index(drop=True)
+        part["PassengerId"] = np.arange(start + 1, start + n + 1)
+        for column in ("Age", "Fare"):
+            part[column] = (part[column] * rng.uniform(0.9, 1.1, n)).round(2)
+        part.to_csv(out_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def summarize(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(ordered[len(ordered) // 2], 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def peak_rss_mb(who: int) -> float:
+    """ru_maxrss is reported in KiB on Linux and bytes on macOS"""
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def install_scripted_models(latency: float):
+    from backend.agent_backend import registry
+    from backend.fake_llm import ScriptedChatModel
+
+    generator = ScriptedChatModel(responses=[scripted_generator], latency=latency)
+    evaluator = ScriptedChatModel(responses=[scripted_evaluator], latency=latency)
+    registry.cache = None
+    # the scripted models have no provider limits; the default gateway's tokens/min would pace the run
+    registry.gateway = None
+    registry.reload(generator_llm=generator, evaluator_llm=evaluator)
+    return generator, evaluator
+
+
+def measure_workflow(csv_path: str, runs: int, latency: float, max_retry: int) -> dict:
+    """Ingestion time, per-node latency and peak RSS for one dataset (runs in a child process)"""
+    from backend.agent_backend import run_workflow
+    from backend.chart_store import chart_store
+    from backend.dataset_store import dataset_store
+    from backend.sandbox import chart_sandbox
+    from backend.utils import load_csv_data
+
+    generator, evaluator = install_scripted_models(latency)
+    if chart_sandbox is not None:
+        chart_sandbox.start()
+
+    start = time.perf_counter()
+    df, schema = load_csv_data(csv_path)
+    ingest_seconds = time.perf_counter() - start
+    dataset_id = dataset_store.put(df)
+
+    node_seconds = {node: [] for node in NODES}
+    workflow_seconds, iterations, prompt_tokens = [], [], []
+    for _ in range(runs):
+        events = []
+        state = {"user_query": QUERY, "dataset_id": dataset_id, "schema": schema, "max_retry": max_retry,
+                 "rubric": None, "chart_code": None, "chart_path": None, "run_id": chart_store.new_namespace()}
+        start = time.perf_counter()
+        final_state = run_workflow(state, on_event=events.append)
+        workflow_seconds.append(time.perf_counter() - start)
+        iterations.append(len(final_state.get("chart_path") or []))
+        if max_retry > 1 and iterations[-1] < 2:
+            raise RuntimeError("the scripted failure was not retried; the benchmark no longer measures a retry")
+        prompt_tokens.append(final_state.get("prompt_tokens") or [])
+        # event timestamps are cumulative; the gap to the previous event is the node's own time
+        previous = 0.0
+        for event in events:
+            node_seconds.setdefault(event["node"], []).append(event["elapsed"] - previous)
+            previous = event["elapsed"]
+
+    if chart_sandbox is not None:
+        # reap the workers so their peak RSS is visible through RUSAGE_CHILDREN
+        chart_sandbox.shutdown()
+    return {
+        "rows": len(df),
+        "columns": df.shape[1],
+        "csv_bytes": os.path.getsize(csv_path),
+        "frame_bytes": int(df.memory_usage(deep=True).sum()),
+        "ingest_seconds": round(ingest_seconds, 4),
+        "workflow_seconds": summarize(workflow_seconds),
+        "iterations_per_run": iterations,
+        "generator_prompt_tokens_per_iteration": prompt_tokens,
+        "node_seconds": {node: summarize(samples) for node, samples in node_seconds.items()},
+        "model_calls": {"generator": generator.calls, "evaluator": evaluator.calls},
+        "evaluator_prompt_tokens": {kind: summarize(samples) for kind, samples in EVALUATOR_PROMPT_TOKENS.items()},
+        "peak_rss_mb": {"process": peak_rss_mb(resource.RUSAGE_SELF),
+                        "sandbox_workers": peak_rss_mb(resource.RUSAGE_CHILDREN)},
+    }
+
+
+def measure_rps(csv_path: str, requests: int, concurrency: int, latency: float, max_retry: int) -> dict:
+    """Completed /analyze jobs per second through the FastAPI app (submit + poll for the result)"""
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    install_scripted_models(latency)
+    with open(csv_path, "rb") as f:
+        payload = f.read()
+
+    latencies, failures = [], []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker(client: TestClient):
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            response = client.post("/analyze", files={"file": ("data.csv", payload, "text/csv")},
+                                   data={"user_query": QUERY, "max_retry": str(max_retry)})
+            if response.status_code != 202:
+                with lock:
+                    failures.append(response.status_code)
+                continue
+            job_id = response.json()["job_id"]
+            while True:
+                result = client.get(f"/jobs/{job_id}/result")
+                if result.status_code != 202:
+                    break
+                time.sleep(0.02)
+            with lock:
+                if result.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    failures.append(result.status_code)
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(client,)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "completed": len(latencies),
+        "failed": failures,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(latencies) / wall, 3) if wall else None,
+        "latency_seconds": summarize(latencies),
+    }
+
+
+def measure_batch(csv_path: str, queries: int, concurrency: int, latency: float, max_retry: int) -> dict:
+    """Wall time of a report pack: one /analyze call per query (one after another) vs one /analyze/batch"""
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    install_scripted_models(latency)
+    with open(csv_path, "rb") as f:
+        payload = f.read()
+
+    def wait(client: TestClient, job_id: str):
+        while True:
+            result = client.get(f"/jobs/{job_id}/result")
+            if result.status_code != 202:
+                return result
+            time.sleep(0.02)
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        for _ in range(queries):
+            response = client.post("/analyze", files={"file": ("data.csv", payload, "text/csv")},
+                                   data={"user_query": QUERY, "max_retry": str(max_retry)})
+            wait(client, response.json()["job_id"])
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post("/analyze/batch", files={"file": ("data.csv", payload, "text/csv")},
+                               data={"queries": [QUERY] * queries, "max_retry": str(max_retry),
+                                     "concurrency": str(concurrency)})
+        result = wait(client, response.json()["job_id"])
+        batch = time.perf_counter() - start
+    results = result.json()["response"]["results"] if result.status_code == 200 else []
+    return {
+        "queries": queries,
+        "concurrency": concurrency,
+        "completed": sum(1 for item in results if item["status"] == "completed"),
+        "sequential_seconds": round(sequential, 3),
+        "batch_seconds": round(batch, 3),
+        "speedup": round(sequential / batch, 2) if batch else None,
+    }
+
+
+def run_child(mode: str, csv_path: str, args) -> dict:
+    """Run one measurement in a fresh interpreter and parse its JSON report"""
+    command = [sys.executable, "-m", "benchmarks.bench_workflow", "--child", mode, "--csv", csv_path,
+               "--runs", str(args.runs), "--latency", str(args.latency), "--max-retry", str(args.max_retry),
+               "--rps-requests", str(args.rps_requests), "--rps-concurrency", str(args.rps_concurrency),
+               "--batch-queries", str(args.batch_queries), "--batch-concurrency", str(args.batch_concurrency)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"benchmark child failed:\n{completed.stderr[-4000:]}")
+    # the report is the last stdout line; libraries may print before it
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="comma separated row counts (up to 5000000)")
+    parser.add_argument("--runs", type=int, default=3, help="workflow runs per dataset size")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per model call")
+    parser.add_argument("--max-retry", type=int, default=3)
+    parser.add_argument("--rps-requests", type=int, default=20, help="requests for the API throughput run (0 skips it)")
+    parser.add_argument("--rps-concurrency", type=int, default=4)
+    parser.add_argument("--batch-queries", type=int, default=10, help="queries for the report pack run (0 skips it)")
+    parser.add_argument("--batch-concurrency", type=int, default=4)
+    parser.add_argument("--data", default="data/titanic.csv")
+    parser.add_argument("--output", default="benchmarks/results/bench_workflow.json")
+    parser.add_argument("--child", choices=("workflow", "rps", "batch"), help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "workflow":
+        print(json.dumps(measure_workflow(args.csv, args.runs, args.latency, args.max_retry)))
+        return
+    if args.child == "rps":
+        print(json.dumps(measure_rps(args.csv, args.rps_requests, args.rps_concurrency, args.latency, args.max_retry)))
+        return
+    if args.child == "batch":
+        print(json.dumps(measure_batch(args.csv, args.batch_queries, args.batch_concurrency, args.latency, args.max_retry)))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    report = {
+        "benchmark": "bench_workflow",
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"runs": args.runs, "latency": args.latency, "max_retry": args.max_retry,
+                     "sandbox": os.getenv("CHART_SANDBOX", "1") != "0"},
+        "datasets": [],
+        "api": None,
+        "batch": None,
+    }
+    with tempfile.TemporaryDirectory(prefix="bench-workflow-") as tmp:
+        for rows in sizes:
+            csv_path = os.path.join(tmp, f"titanic_{rows}.csv")
+            make_dataset(args.data, rows, csv_path)
+            result = run_child("workflow", csv_path, args)
+            report["datasets"].append(result)
+            nodes = "  ".join(f"{node}={result['node_seconds'][node].get('mean', 0):.3f}s" for node in NODES)
+            print(f"{rows:>9} rows  ingest={result['ingest_seconds']:.3f}s  "
+                  f"workflow={result['workflow_seconds']['mean']:.3f}s  {nodes}  "
+                  f"rss={result['peak_rss_mb']['process']}MB/{result['peak_rss_mb']['sandbox_workers']}MB")
+            tokens = result["evaluator_prompt_tokens"]
+            if tokens["multimodal"].get("count"):
+                print(f"{'':>15}evaluator prompt tokens: image part={tokens['multimodal']['mean']:.0f}  "
+                      f"base64 as text={tokens['base64_text']['mean']:.0f}  "
+                      f"(image alone: low={tokens['image_low']['mean']:.0f} high={tokens['image_high']['mean']:.0f})")
+            os.remove(csv_path)
+
+        if args.rps_requests > 0:
+            csv_path = os.path.join(tmp, "titanic_api.csv")
+            make_dataset(args.data, min(sizes), csv_path)
+            report["api"] = run_child("rps", csv_path, args)
+            print(f"api: {report['api']['requests_per_second']} req/s "
+                  f"({report['api']['completed']}/{report['api']['requests']} completed, "
+                  f"concurrency {report['api']['concurrency']})")
+
+        if args.batch_queries > 0:
+            csv_path = os.path.join(tmp, "titanic_batch.csv")
+            make_dataset(args.data, min(sizes), csv_path)
+            report["batch"] = run_child("batch", csv_path, args)
+            print(f"batch: {report['batch']['queries']} queries  sequential={report['batch']['sequential_seconds']}s  "
+                  f"batch={report['batch']['batch_seconds']}s  ({report['batch']['speedup']}x, "
+                  f"concurrency {report['batch']['concurrency']})")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
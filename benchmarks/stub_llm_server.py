@@ -0,0 +1,162 @@
+"""Local OpenAI-compatible chat completions stub that simulates provider latency and 429 rate limiting.
+
+Answers structured-output requests (tools or json_schema response_format) with a value generated
+from the requested JSON schema, so ChatOpenAI(...).with_structured_output(...) works against it.
+
+Run from the project root:
+    python -m benchmarks.stub_llm_server --port 8900 --rpm 60 --latency 0.3
+then point a client at base_url="http://127.0.0.1:8900/v1".
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def sample_from_schema(schema: dict, defs: dict = None):
+    """Smallest value that validates against a (pydantic-generated) JSON schema"""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return sample_from_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            return sample_from_schema(schema[key][0], defs)
+    kind = schema.get("type", "object")
+    if isinstance(kind, list):
+        kind = kind[0]
+    if kind == "object":
+        return {name: sample_from_schema(prop, defs) for name, prop in schema.get("properties", {}).items()}
+    return {"string": "stub", "integer": 1, "number": 1.0, "boolean": True, "array": [], "null": None}[kind]
+
+
+class StubState:
+    """Shared counters and the stub's own requests/min window"""
+
+    def __init__(self, rpm: float, latency: float, error_rate: float, retry_after: bool, window: float = 1.0):
+        self.rpm = rpm
+        self.window_seconds = window
+        # providers enforce per-minute limits over shorter windows too
+        self.limit = max(1, int(rpm * window / 60)) if rpm else 0
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.window: list[float] = []
+        self.counts = {"ok": 0, "rate_limited": 0, "server_error": 0}
+
+    def admit(self) -> bool:
+        """Sliding window admitting rpm * window / 60 requests, like a provider's requests-per-minute limit"""
+        now = time.monotonic()
+        with self.lock:
+            self.window = [t for t in self.window if now - t < self.window_seconds]
+            if self.limit and len(self.window) >= self.limit:
+                self.counts["rate_limited"] += 1
+                return False
+            self.window.append(now)
+            return True
+
+    def seconds_until_free(self) -> float:
+        with self.lock:
+            return max(0.0, self.window_seconds - (time.monotonic() - self.window[0])) if self.window else 0.0
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not state.admit():
+                headers = {"retry-after-ms": str(int(state.seconds_until_free() * 1000))} if state.retry_after else {}
+                self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                               "code": "rate_limit_exceeded"}}, headers)
+                return
+            if state.latency:
+                time.sleep(random.uniform(0.5, 1.5) * state.latency)
+            if random.random() < state.error_rate:
+                with state.lock:
+                    state.counts["server_error"] += 1
+                self.send_json(500, {"error": {"message": "Stub server error", "type": "server_error"}})
+                return
+            with state.lock:
+                state.counts["ok"] += 1
+            self.send_json(200, completion(request))
+
+    return Handler
+
+
+def completion(request: dict) -> dict:
+    """chat.completion body answering the request's tool / json_schema with a schema-valid value"""
+    message = {"role": "assistant", "content": "stub response"}
+    if request.get("tools"):
+        function = request["tools"][0]["function"]
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+            "function": {"name": function["name"],
+                         "arguments": json.dumps(sample_from_schema(function.get("parameters", {})))},
+        }]}
+    elif (request.get("response_format") or {}).get("type") == "json_schema":
+        schema = request["response_format"]["json_schema"].get("schema", {})
+        message = {"role": "assistant", "content": json.dumps(sample_from_schema(schema))}
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "stub"),
+        "choices": [{"index": 0, "message": message,
+                     "finish_reason": "tool_calls" if "tool_calls" in message else "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+    }
+
+
+def start_stub_server(port: int = 0, rpm: float = 60, latency: float = 0.3, error_rate: float = 0.0,
+                      retry_after: bool = True, window: float = 1.0) -> tuple[ThreadingHTTPServer, StubState]:
+    """Serve the stub on a background thread; port 0 picks a free port (see server.server_address)"""
+    state = StubState(rpm, latency, error_rate, retry_after, window)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--rpm", type=float, default=60, help="requests per minute before answering 429")
+    parser.add_argument("--latency", type=float, default=0.3, help="mean seconds per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of admitted calls answered with 500")
+    parser.add_argument("--window", type=float, default=1.0, help="seconds over which the rpm limit is enforced")
+    parser.add_argument("--no-retry-after", action="store_true", help="send 429s without a retry-after-ms header")
+    args = parser.parse_args()
+    server, _ = start_stub_server(args.port, args.rpm, args.latency, args.error_rate, not args.no_retry_after,
+                                  args.window)
+    print(f"stub listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
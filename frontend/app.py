@@ -4,21 +4,11 @@ import pandas as pd
 from io import BytesIO
 from PIL import Image
 import os
+import json
+import hashlib
 
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
-CLEAR_CHARTS_URL = f"{BACKEND_URL}/charts/delete"
-
-def clear_charts():
-    """Hit delete api endpoint to delete existing charts"""
-    try:
-        response = requests.delete(CLEAR_CHARTS_URL)
-        if response.status_code == 200:
-            st.success("Existing charts cleared successfully.")
-        else:
-            st.error("Failed to clear existing charts")
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error: {str(e)}")
 
 st.set_page_config(page_title="Agentic BI Analyst", layout="wide")
 st.title("📊 Agentic BI Analyst Demo")
@@ -30,6 +20,9 @@ clear = st.sidebar.button("Clear Output",width = "stretch",type="secondary")
 # Initialize session state for storing recent queries
 if "recent_queries" not in st.session_state:
     st.session_state["recent_queries"] = []
+# sha256 of an uploaded file -> dataset_id registered with the backend
+if "dataset_ids" not in st.session_state:
+    st.session_state["dataset_ids"] = {}
 
 # Sidebar — display last 5 queries
 st.sidebar.header("Recent Queries")
@@ -46,58 +39,143 @@ if clear:
 uploaded_file = st.file_uploader("Upload CSV file", type=["csv"])
 user_query = st.text_area("Describe the visualization you want:", height=50)
 max_retry = st.number_input("Max retries", min_value=1, max_value=5, value=3)
+num_candidates = st.number_input("Parallel candidates (best-of-N first attempt)", min_value=1, max_value=5, value=1)
+plan_mode = st.selectbox("Aggregate before plotting", ["Auto (large datasets)", "On", "Off"])
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a Server-Sent Events response"""
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+def show_chart(chart_path):
+    """Fetch a chart from the backend and display it"""
+    chart_url = f"{BACKEND_URL}/{chart_path}"
+    img_response = requests.get(chart_url)
+    if img_response.status_code == 200:
+        image = Image.open(BytesIO(img_response.content))
+        st.image(image, caption=chart_path, use_container_width=True)
+    else:
+        st.warning(f"Chart not found at: {chart_url}")
+
+def show_rubric(rubric):
+    """Display one rubric as a table"""
+    st.markdown("**Rubric Feedback**")
+    if rubric:
+        df = pd.DataFrame(list(rubric.items()), columns=["Criteria", "Score"])
+        st.dataframe(df, use_container_width=True)
+    else:
+        st.info("No rubric feedback available for this iteration.")
+
+def register_dataset(contents):
+    """Upload the CSV once per session; later queries only send its dataset_id"""
+    digest = hashlib.sha256(contents).hexdigest()
+    if digest in st.session_state["dataset_ids"]:
+        return digest, st.session_state["dataset_ids"][digest], None
+    response = requests.post(f"{BACKEND_URL}/datasets", files={"file": contents})
+    if response.status_code != 201:
+        return digest, None, response
+    st.session_state["dataset_ids"][digest] = response.json()["dataset_id"]
+    return digest, st.session_state["dataset_ids"][digest], None
+
+def post_analysis(url, contents, data):
+    """Start a streamed analysis by dataset_id, re-uploading once if the backend no longer has it"""
+    for attempt in range(2):
+        digest, dataset_id, failed = register_dataset(contents)
+        if failed is not None:
+            return failed
+        response = requests.post(url, data={**data, "dataset_id": dataset_id}, stream=True)
+        if response.status_code != 404 or attempt:
+            return response
+        # evicted or backend restarted without its spill directory
+        response.close()
+        st.session_state["dataset_ids"].pop(digest, None)
 
 if st.button("Generate Charts",width="stretch",type="primary"):
-    # clear the Charts folder
-    clear_charts()
-    
     # check for required inputs from user
     if uploaded_file and user_query.strip():
-        files = {"file": uploaded_file.getvalue()}
-        data = {"user_query": user_query, "max_retry": str(max_retry)}
-
-        with st.spinner("⏳ Running your agentic workflow..."):
-            FASTAPI_URL = f"{BACKEND_URL}/analyze"
-            response = requests.post(FASTAPI_URL, files=files, data=data)
-
-        if response.status_code == 200:
-            result = response.json()['response']
-            charts = result.get("charts", [])
-            rubrics = result.get("rubric_feedback", [])
-
-            # append user query to the session state
-            st.session_state["recent_queries"].append(user_query)
-            st.session_state["recent_queries"] = st.session_state["recent_queries"][-5:]
-
-            if not charts:
-                st.error("No charts were generated.")
+        data = {"user_query": user_query, "max_retry": str(max_retry), "num_candidates": str(num_candidates)}
+        if plan_mode != "Auto (large datasets)":
+            data["plan_mode"] = str(plan_mode == "On").lower()
+
+        FASTAPI_URL = f"{BACKEND_URL}/analyze/stream"
+        status = st.status("⏳ Running your agentic workflow...", expanded=False)
+        # render each iteration as soon as its node events arrive
+        with post_analysis(FASTAPI_URL, uploaded_file.getvalue(), data) as response:
+            if response.status_code != 200:
+                status.update(label="Request failed", state="error")
+                st.error(f"❌ Request failed: {response.text}")
             else:
-                st.success(f"✅ Generated {len(charts)} chart versions")
-
-                for i, (chart_path, rubric) in enumerate(zip(charts, rubrics)):
-                    st.markdown(f"### 🧩 Iteration {i+1}")
-                    cols = st.columns([2, 3])
-
-                    # --- Display Chart ---
-                    with cols[0]:
-                        chart_url = f"{BACKEND_URL}/{chart_path}"
-                        img_response = requests.get(chart_url)
-                        if img_response.status_code == 200:
-                            image = Image.open(BytesIO(img_response.content))
-                            st.image(image, caption=chart_path, use_container_width=True)
-                        else:
-                            st.warning(f"Chart not found at: {chart_url}")
-
-                    # --- Display Rubric ---
-                    with cols[1]:
-                        st.markdown("**Rubric Feedback**")
-                        if rubric:
-                            df = pd.DataFrame(list(rubric.items()), columns=["Criteria", "Score"])
-                            st.dataframe(df, use_container_width=True)
+                iteration = 0
+                cols = None
+                rubric_slot = None
+                for event, payload in iter_sse(response):
+                    if event == "node":
+                        node = payload["node"]
+                        status.update(label=f"⏳ {node} finished after {payload['elapsed']:.1f}s")
+                        if node == "generate_chart_code":
+                            iteration += 1
+                            st.markdown(f"### 🧩 Iteration {iteration}")
+                            cols = st.columns([2, 3])
+                            with cols[1]:
+                                with st.expander("Generated code"):
+                                    if payload.get("aggregation_spec"):
+                                        st.markdown("**Aggregation spec**")
+                                        st.json(payload["aggregation_spec"])
+                                    st.code(payload.get("chart_code") or "", language="python")
+                                    if payload.get("prompt_tokens"):
+                                        st.caption(f"Prompt: {payload['prompt_tokens']} tokens")
+                                rubric_slot = st.empty()
+                            chart_path = payload.get("chart_path")
+                        elif node == "generate_chart" and cols is not None:
+                            # --- Display Chart (or the execution error) ---
+                            if payload.get("rubric") and payload["rubric"].get("error"):
+                                with rubric_slot.container():
+                                    show_rubric(payload["rubric"])
+                            else:
+                                with cols[0]:
+                                    show_chart(chart_path)
+                        elif node == "generate_candidates":
+                            # best-of-N round: show the winning candidate as the first iteration
+                            iteration += 1
+                            st.markdown(f"### 🧩 Iteration {iteration} (best of {len(payload.get('candidates') or [])})")
+                            cols = st.columns([2, 3])
+                            chart_path = payload.get("chart_path")
+                            with cols[0]:
+                                show_chart(chart_path)
+                            with cols[1]:
+                                with st.expander("Generated code"):
+                                    if payload.get("aggregation_spec"):
+                                        st.markdown("**Aggregation spec**")
+                                        st.json(payload["aggregation_spec"])
+                                    st.code(payload.get("chart_code") or "", language="python")
+                                rubric_slot = st.empty()
+                                with rubric_slot.container():
+                                    show_rubric(payload.get("rubric"))
+                        elif node == "evaluate_chart" and rubric_slot is not None:
+                            # --- Display Rubric ---
+                            with rubric_slot.container():
+                                show_rubric(payload.get("rubric"))
+                    elif event == "completed":
+                        charts = (payload.get("result") or {}).get("charts") or []
+                        # append user query to the session state
+                        st.session_state["recent_queries"].append(user_query)
+                        st.session_state["recent_queries"] = st.session_state["recent_queries"][-5:]
+                        if not charts:
+                            status.update(label="No charts were generated.", state="error")
+                            st.error("No charts were generated.")
                         else:
-                            st.info("No rubric feedback available for this iteration.")
-        else:
-            st.error(f"❌ Request failed: {response.text}")
+                            status.update(label=f"✅ Generated {len(charts)} chart versions", state="complete")
+                    elif event in ("failed", "cancelled"):
+                        status.update(label=f"Workflow {event}", state="error")
+                        st.error(f"❌ Request {event}: {payload.get('error')}")
     else:
         st.warning("Please upload a CSV and enter a valid query.")
 